@@ -0,0 +1,208 @@
+"""
+Versioned cache namespaces.
+
+Cached values are stored under keys that embed a namespace version, e.g.
+`branch-analytics:7` -> `v3`. Invalidating the namespace is a single
+increment of its version; entries written under the old version are never
+read again and simply expire. This works the same on Redis and locmem and
+needs no key scans.
+
+CachedResponseMixin builds on this to cache whole read responses, keyed by
+endpoint, query string, role/branch scope and the versions of the models
+the response is built from; `track_model_changes()` bumps a model's version
+on every save and delete.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+from .conditional import etag_matches
+
+# Backends whose entries only the writing process can see
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+VERSION_KEY = 'version:{}'
+# Version counters outlive the entries they guard
+VERSION_TTL = None
+
+
+def cache_is_shared():
+    """Whether a cache write in one process is seen by every other process."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def get_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        # add() so two cold readers agree on the starting version
+        cache.add(key, 1, VERSION_TTL)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, VERSION_TTL)
+
+
+def bump_on_commit(*namespaces):
+    """
+    Invalidate `namespaces` once the current transaction commits (at once
+    outside a transaction), so no reader can cache pre-commit data under
+    the new version.
+    """
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+
+    transaction.on_commit(bump)
+
+
+def get_versions(namespaces):
+    """Versions of several namespaces in one cache round trip."""
+    keys = {namespace: VERSION_KEY.format(namespace) for namespace in namespaces}
+    found = cache.get_many(keys.values())
+    versions = []
+    for namespace, key in keys.items():
+        version = found.get(key)
+        versions.append(get_version(namespace) if version is None else version)
+    return versions
+
+
+def versioned_key(namespace, *parts):
+    return ':'.join(str(part) for part in (namespace, f'v{get_version(namespace)}', *parts))
+
+
+def model_namespace(model):
+    return f'model:{model._meta.label_lower}'
+
+
+def bump_models(*models):
+    """For writes that send no signals (QuerySet.update(), bulk_create())."""
+    bump_on_commit(*(model_namespace(model) for model in models))
+
+
+def model_changed(sender, **kwargs):
+    bump_on_commit(model_namespace(sender))
+
+
+def track_model_changes(*models):
+    """Bump each model's namespace after any save or delete of one of its rows."""
+    for model in models:
+        post_save.connect(model_changed, sender=model, dispatch_uid=f'{model_namespace(model)}:save')
+        post_delete.connect(model_changed, sender=model, dispatch_uid=f'{model_namespace(model)}:delete')
+
+
+STATS_KEY = 'response-cache:{}:{}'
+
+
+def record_cache_event(name, event):
+    key = STATS_KEY.format(name, event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def response_cache_stats():
+    """{view name: {'hits': n, 'misses': n, 'hit_rate': float|None}} for every cached view."""
+    names = sorted(CachedResponseMixin.registry)
+    keys = {(name, event): STATS_KEY.format(name, event) for name in names for event in ('hits', 'misses')}
+    found = cache.get_many(keys.values())
+    stats = {}
+    for name in names:
+        hits = found.get(keys[name, 'hits'], 0)
+        misses = found.get(keys[name, 'misses'], 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Cache list/retrieve responses of a view.
+
+    Views opt in by listing the models their responses are built from in
+    `cache_models`; any save or delete of those models (tracked with
+    track_model_changes) retires every cached entry. Entries are shared by
+    callers with the same role and branch, so only use this on views whose
+    querysets and permissions depend on nothing else. Other changes, e.g.
+    QuerySet.update(), show up within RESPONSE_CACHE_TTL seconds.
+
+    Cached ETag/Last-Modified headers are replayed, and a matching
+    If-None-Match is answered with 304 straight from the cache. Hits and
+    misses are counted per view (see response_cache_stats()).
+    """
+    cache_models = ()
+    cache_timeout = None
+    registry = set()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.cache_models:
+            CachedResponseMixin.registry.add(cls.__name__)
+
+    def get_scope(self, request):
+        user = request.user
+        return getattr(user, 'role', None), getattr(user, 'gym_branch_id', None)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        versions = get_versions([model_namespace(model) for model in self.cache_models])
+        scope = (
+            request.get_host(), request.path, sorted(request.query_params.lists()),
+            self.get_scope(request), versions,
+        )
+        digest = hashlib.sha1(repr(scope).encode()).hexdigest()
+        return f'response:{type(self).__name__}:{digest}'
+
+    def cached_response(self, request, render, *args, **kwargs):
+        name = type(self).__name__
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            record_cache_event(name, 'hits')
+            data, headers = cached
+            if 'ETag' in headers and request.META.get('HTTP_IF_NONE_MATCH') \
+                    and etag_matches(request, headers['ETag']):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(data)
+            for header, value in headers.items():
+                response[header] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record_cache_event(name, 'misses')
+        response = render(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {
+                header: response[header]
+                for header in ('ETag', 'Last-Modified', 'Cache-Control')
+                if header in response
+            }
+            timeout = self.cache_timeout if self.cache_timeout is not None else settings.RESPONSE_CACHE_TTL
+            cache.set(key, (response.data, headers), timeout)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,193 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has been modified since you last read it.'
+    default_code = 'precondition_failed'
+
+
+class EditConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The resource was modified by a concurrent request. Reload it and try again.'
+    default_code = 'edit_conflict'
+
+
+def etag_matches(request, etag):
+    """Weak comparison against If-None-Match, as RFC 9110 requires."""
+    tags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    current = etag.removeprefix('W/')
+    return '*' in tags or any(tag.removeprefix('W/') == current for tag in tags)
+
+
+def if_match_version(request):
+    """
+    The version a write is conditional on, from `If-Match: "<version>"` or
+    the `"<version>-<hash>"` ETag a detail GET returned (see
+    ConditionalGetMixin.etag_version_field); None without the header or for
+    `*`. Weak or malformed tags never match.
+    """
+    header = request.META.get('HTTP_IF_MATCH')
+    if not header:
+        return None
+    tags = parse_etags(header)
+    if '*' in tags:
+        return None
+    version = tags[0][1:-1].split('-', 1)[0] if len(tags) == 1 and tags[0].startswith('"') else ''
+    if not version.isdigit():
+        raise PreconditionFailed()
+    return int(version)
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list and retrieve.
+
+    The validator for a list is the row count and the newest `updated_at`
+    of the scoped, filtered queryset, taken in one aggregate query; views add
+    the `updated_at` of joined rows whose data they render through
+    `conditional_related` (e.g. ('workout_plan',)). It is hashed together with
+    the path, query string and the caller's id/role/branch, so two users never
+    share an ETag. When the client's If-None-Match still matches, a 304 is
+    returned before the page is fetched or serialized. Retrieve derives the
+    validator from the object it already loaded, at no extra cost, and also
+    honours If-Modified-Since. Views of versioned models name the field in
+    `etag_version_field`; their detail ETag is then the strong
+    `"<version>-<hash>"`, which writes accept back in If-Match.
+
+    The list aggregate is cached under the versions of the view's model and
+    its `conditional_related` models (see CORE.cache), so polling an
+    unchanged list runs no query at all; every tracked save or delete, and
+    every bulk write that calls bump_models(), retires it. Untracked writes
+    (raw SQL) show up within CONDITIONAL_VALIDATOR_CACHE_TTL seconds.
+
+    The count is handed to the paginator, so a full response costs no more
+    queries than before. Requests whose paginator skips the total (cursor
+    mode, ?count=false) or would report the planner's estimate instead of
+    counting (see CORE.pagination) are served without validators.
+    """
+    conditional_related = ()
+    etag_version_field = None
+
+    def list(self, request, *args, **kwargs):
+        counts_rows = getattr(self.paginator, 'counts_rows', None)
+        if counts_rows is not None and not counts_rows(request):
+            # Cursor and ?count=false pages exist to avoid counting the scope
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        estimate_count = getattr(self.paginator, 'estimate_count', None)
+        if estimate_count is not None and estimate_count(queryset, request) is not None:
+            # Too large to count exactly, and the validator would have to
+            return super().list(request, *args, **kwargs)
+
+        validator = self.get_list_validator(queryset)
+        stamps = [value for name, value in validator.items() if name != 'count' and value]
+        last_modified = max(stamps, default=None)
+        etag = self.make_etag(request, [validator[name] for name in sorted(validator)])
+        # A deletion can leave max(updated_at) unchanged, so a list is only
+        # revalidated by ETag (which covers the count), never by date alone
+        response = self.conditional_response(request, etag, last_modified, use_modified_since=False)
+        if response is None:
+            if hasattr(self.paginator, 'known_count'):
+                self.paginator.known_count = validator['count']
+            response = super().list(request, *args, **kwargs)
+        return self.finalize_conditional(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        stamps = [instance.updated_at]
+        for related in self.get_conditional_related():
+            # Relations the queryset did not join are not rendered either
+            if instance._meta.get_field(related).is_cached(instance):
+                stamps.append(getattr(getattr(instance, related), 'updated_at', None))
+
+        last_modified = max(filter(None, stamps))
+        version = getattr(instance, self.etag_version_field) if self.etag_version_field else None
+        etag = self.make_etag(request, [instance.pk] + stamps, version=version)
+        response = self.conditional_response(request, etag, last_modified)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return self.finalize_conditional(response, etag, last_modified)
+
+    def get_conditional_related(self):
+        return self.conditional_related
+
+    def get_list_validator(self, queryset):
+        """
+        Count and newest updated_at of the scope and its related rows. The
+        aggregate is cached under the versions of every model it reads, so
+        it is only recomputed after a write to one of them.
+        """
+        from .cache import get_versions, model_namespace
+
+        related = self.get_conditional_related()
+        aggregates = {'count': Count('pk'), 'modified': Max('updated_at')}
+        for name in related:
+            aggregates[name] = Max(f'{name}__updated_at')
+        queryset = queryset.order_by()
+
+        try:
+            sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        except EmptyResultSet:
+            return queryset.aggregate(**aggregates)
+        models = [queryset.model] + [queryset.model._meta.get_field(name).related_model for name in related]
+        versions = get_versions([model_namespace(model) for model in models])
+        scope = f'{queryset.db}:{sql}:{params!r}:{related!r}:{versions!r}'
+        key = f'conditional:validator:{hashlib.sha256(scope.encode()).hexdigest()}'
+
+        validator = cache.get(key)
+        if validator is None:
+            validator = queryset.aggregate(**aggregates)
+            cache.set(key, validator, settings.CONDITIONAL_VALIDATOR_CACHE_TTL)
+        return validator
+
+    def get_scope(self, request):
+        """What, besides the URL, the response depends on."""
+        user = request.user
+        return getattr(user, 'id', None), getattr(user, 'role', None), getattr(user, 'gym_branch_id', None)
+
+    def make_etag(self, request, state, version=None):
+        scope = (
+            request.path,
+            request.META.get('QUERY_STRING', ''),
+            self.get_scope(request),
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in state],
+        )
+        digest = hashlib.sha1(repr(scope).encode()).hexdigest()
+        if version is not None:
+            return '"%s-%s"' % (version, digest)
+        return 'W/"%s"' % digest
+
+    @staticmethod
+    def conditional_response(request, etag, last_modified, use_modified_since=True):
+        """A 304 response if the client's copy is still current, else None."""
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED)
+            return None
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if use_modified_since and if_modified_since and last_modified \
+                and int(last_modified.timestamp()) <= if_modified_since:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return None
+
+    @staticmethod
+    def finalize_conditional(response, etag, last_modified):
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            # Clients may keep the copy but must revalidate it
+            response['Cache-Control'] = 'private, no-cache'
+        return response
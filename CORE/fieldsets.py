@@ -0,0 +1,140 @@
+"""
+Sparse fieldsets: `?fields=id,email` on read endpoints.
+
+The response is limited to the requested serializer fields, and the
+queryset is narrowed to match: only the columns those fields read are
+selected, and a relation is joined only when a requested field reads
+through it. `fields` is ignored on writes.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PrimaryKeyRelatedField
+
+
+def field_lookups(field, sources=None):
+    """ORM lookups a serializer field reads, e.g. `workout_plan.title` -> ['workout_plan__title']."""
+    if sources is not None:
+        return list(sources)
+    if isinstance(field, PrimaryKeyRelatedField):
+        return [field.source]
+    return ['__'.join(field.source_attrs)]
+
+
+def narrow_queryset(queryset, lookups):
+    """`only()` the columns behind `lookups`, joining just the relations they cross."""
+    columns, joins = set(), set()
+    for lookup in lookups:
+        model, path = queryset.model, []
+        parts = lookup.split('__')
+        for index, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f'{lookup!r} is not a column of {queryset.model.__name__}; declare its sources in field_sources'
+                )
+            if field.is_relation and index < len(parts) - 1:
+                path.append(part)
+                joins.add('__'.join(path))
+                model = field.related_model
+            else:
+                columns.add('__'.join([*path, part]))
+    return queryset.select_related(None).select_related(*joins).only(*columns)
+
+
+class SparseFieldsetMixin:
+    """
+    Views list, in `field_sources`, the lookups behind serializer fields
+    whose source is a property or method (`values_computed` entries are
+    picked up too). Columns read regardless of the requested fields go in
+    `sparse_required_fields`, and those only object permissions read (on
+    retrieve) in `sparse_object_fields`.
+    """
+    fields_query_param = 'fields'
+    field_sources = {}
+    sparse_required_fields = ()
+    sparse_object_fields = ()
+    sparse_actions = ('list', 'retrieve')
+
+    def get_requested_fields(self):
+        """The requested field names in serializer order, or None for all fields."""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self.parse_requested_fields()
+        return self._requested_fields
+
+    def get_sparse_action(self):
+        # Generic (non-viewset) views have no action; a lookup kwarg means retrieve
+        action = getattr(self, 'action', None)
+        if action is None:
+            lookup = self.lookup_url_kwarg or self.lookup_field
+            action = 'retrieve' if lookup in self.kwargs else 'list'
+        return action
+
+    def parse_requested_fields(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS \
+                or self.get_sparse_action() not in self.sparse_actions:
+            return None
+        raw = request.query_params.get(self.fields_query_param)
+        if not raw:
+            return None
+
+        requested = [name.strip() for name in raw.split(',') if name.strip()]
+        available = [
+            name for name, field in self.get_serializer_class()().fields.items() if not field.write_only
+        ]
+        unknown = sorted(set(requested) - set(available))
+        if unknown:
+            raise ValidationError({self.fields_query_param: f'Unknown field(s): {", ".join(unknown)}.'})
+        return [name for name in available if name in requested]
+
+    def get_field_sources(self):
+        sources = {name: computed[0] for name, computed in getattr(self, 'values_computed', {}).items()}
+        sources.update(self.field_sources)
+        return sources
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = self.get_requested_fields()
+        if requested is None:
+            return queryset
+
+        fields = self.get_serializer_class()().fields
+        sources = self.get_field_sources()
+        lookups = [*self.sparse_required_fields]
+        if self.get_sparse_action() == 'retrieve':
+            lookups.extend(self.sparse_object_fields)
+        for name in requested:
+            lookups.extend(field_lookups(fields[name], sources.get(name)))
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        lookups.extend(name for name in ('created_at', 'updated_at') if name in model_fields)
+        return narrow_queryset(queryset, lookups)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        requested = self.get_requested_fields()
+        if requested is not None:
+            target = serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer
+            for name in list(target.fields):
+                if name not in requested:
+                    target.fields.pop(name)
+        return serializer
+
+    def get_conditional_related(self):
+        # Only relations a requested field reads through are joined, and only
+        # those can change the rendered data
+        related = super().get_conditional_related()
+        requested = self.get_requested_fields()
+        if requested is None:
+            return related
+        fields = self.get_serializer_class()().fields
+        sources = self.get_field_sources()
+        used = {
+            lookup.split('__')[0]
+            for name in requested
+            for lookup in field_lookups(fields[name], sources.get(name))
+            if '__' in lookup
+        }
+        return tuple(name for name in related if name in used)
@@ -0,0 +1,328 @@
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over (-created_at, -id).
+
+    The cursor carries the (created_at, id) of the row at the page edge, so
+    every page is an index range scan of `page_size` rows no matter how deep
+    the client has paged. `id` breaks ties between rows created in the same
+    instant.
+    """
+    ordering_field = 'created_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request)
+
+        field = self.ordering_field
+        if self.reverse:
+            queryset = queryset.order_by(field, 'id')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-id')
+
+        if position is not None:
+            created_at, pk = position
+            # "created_at <= edge" keeps the scan on the index range,
+            # the OR only resolves ties at the edge itself.
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__gte': created_at}) & (Q(**{f'{field}__gt': created_at}) | Q(id__gt=pk))
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lte': created_at}) & (Q(**{f'{field}__lt': created_at}) | Q(id__lt=pk))
+                )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created_at = parse_datetime(tokens['p'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (created_at, pk), reverse
+
+    def encode_cursor(self, row, reverse):
+        # Rows are model instances, or dicts when listed through values()
+        if isinstance(row, dict):
+            position, pk = row[self.ordering_field], row['id']
+        else:
+            position, pk = getattr(row, self.ordering_field), row.pk
+        tokens = {'p': position.isoformat(), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class EstimatedCountLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination that avoids paying a full COUNT(*) per page.
+
+    - `?count=false` omits `count`; one extra row is fetched to decide
+      whether there is a next page.
+    - On PostgreSQL the planner's row estimate is used when it is at least
+      `PAGINATION_ESTIMATED_COUNT_THRESHOLD`, and the response carries
+      `"count_estimated": true`.
+    - Exact counts are cached per scope (the compiled SQL and its params)
+      for `PAGINATION_COUNT_CACHE_TTL` seconds; a cached count is preferred
+      over an estimate. `?count=exact` never estimates.
+    """
+    count_query_param = 'count'
+    cache_key_prefix = 'pagination:count'
+    # Exact count of this request's queryset the view already computed
+    # (see CORE.conditional.ConditionalGetMixin); used instead of counting again
+    known_count = None
+    # Planner estimate estimate_count() already fetched for this request
+    known_estimate = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.count_mode = self.get_count_mode(request)
+        self.count_estimated = False
+        self.has_more = None
+        self.count = None if self.count_mode == 'none' else self.get_count(queryset)
+
+        if self.count is None or self.count_estimated:
+            # No exact total to compare against: probe one row past the page
+            rows = list(queryset[self.offset:self.offset + self.limit + 1])
+            self.has_more = len(rows) > self.limit
+            return rows[:self.limit]
+
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return list(queryset[self.offset:self.offset + self.limit])
+
+    def counts_rows(self, request):
+        """Whether a response to `request` includes a total."""
+        return self.get_count_mode(request) != 'none'
+
+    def get_count_mode(self, request):
+        value = request.query_params.get(self.count_query_param, '').lower()
+        if value in ('false', '0', 'none'):
+            return 'none'
+        if value == 'exact':
+            return 'exact'
+        return 'auto'
+
+    def estimate_count(self, queryset, request):
+        """
+        The planner estimate a page of `request` would report instead of an
+        exact total, or None if it would count (or omit the count). Kept
+        for paginate_queryset(), which then does not ask the planner again.
+        """
+        if self.get_count_mode(request) != 'auto':
+            return None
+        compiled = self.compile(queryset)
+        if not compiled or self.get_cached_count(queryset, compiled) is not None:
+            return None
+        estimate = self.get_estimated_count(queryset, compiled)
+        if estimate is None or estimate < settings.PAGINATION_ESTIMATED_COUNT_THRESHOLD:
+            return None
+        self.known_estimate = estimate
+        return estimate
+
+    def get_count(self, queryset):
+        if self.known_count is not None:
+            return self.known_count
+        if self.known_estimate is not None:
+            self.count_estimated = True
+            return self.known_estimate
+
+        compiled = self.compile(queryset)
+        count = self.get_cached_count(queryset, compiled)
+        if count is not None:
+            return count
+
+        if self.count_mode == 'auto' and compiled:
+            estimate = self.get_estimated_count(queryset, compiled)
+            if estimate is not None and estimate >= settings.PAGINATION_ESTIMATED_COUNT_THRESHOLD:
+                self.count_estimated = True
+                return estimate
+
+        count = super().get_count(queryset)
+        ttl = settings.PAGINATION_COUNT_CACHE_TTL
+        if ttl and compiled:
+            cache.set(self.get_count_cache_key(queryset, compiled), count, ttl)
+        return count
+
+    def get_cached_count(self, queryset, compiled):
+        if not settings.PAGINATION_COUNT_CACHE_TTL or not compiled:
+            return None
+        return cache.get(self.get_count_cache_key(queryset, compiled))
+
+    def compile(self, queryset):
+        try:
+            return queryset.query.get_compiler(using=queryset.db).as_sql()
+        except EmptyResultSet:
+            return None
+
+    def get_count_cache_key(self, queryset, compiled):
+        sql, params = compiled
+        scope = f'{queryset.db}:{sql}:{params!r}'
+        return f'{self.cache_key_prefix}:{hashlib.sha256(scope.encode()).hexdigest()}'
+
+    def get_estimated_count(self, queryset, compiled):
+        """Planner row estimate for the queryset, PostgreSQL only."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        sql, params = compiled
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_next_link(self):
+        if self.has_more is None:
+            return super().get_next_link()
+        if not self.has_more:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count_mode != 'none':
+            payload['count'] = self.count
+        if self.count_estimated:
+            payload['count_estimated'] = True
+        payload.update({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+        return Response(payload)
+
+
+class KeysetOrOffsetPagination(EstimatedCountLimitOffsetPagination):
+    """
+    Limit/offset by default, keyset pagination on request.
+
+    Endpoints opt in by setting this as their `pagination_class`; clients then
+    switch to keyset mode with `?pagination=cursor` (or by following a
+    `cursor` link), while existing `?limit=&offset=` clients are unaffected.
+    """
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def counts_rows(self, request):
+        return not self.use_keyset(request) and super().counts_rows(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
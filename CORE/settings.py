@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
 from dotenv import load_dotenv
 import dj_database_url
@@ -8,6 +9,7 @@ import dj_database_url
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 # SECURITY
 SECRET_KEY = os.getenv('SECRET_KEY')
@@ -117,12 +119,49 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery
 CELERY_BROKER_URL = os.getenv('REDIS_URL')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL')
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'archive-activity-logs': {
+        'task': 'account.tasks.archive_activity_logs',
+        'schedule': timedelta(days=1),
+    },
+    'purge-expired-tokens': {
+        'task': 'account.tasks.purge_expired_tokens',
+        'schedule': timedelta(days=1),
+    },
+    'purge-verification-codes': {
+        'task': 'account.tasks.purge_verification_codes',
+        'schedule': timedelta(hours=1),
+    },
+    'purge-idempotency-keys': {
+        'task': 'account.tasks.purge_idempotency_keys',
+        'schedule': timedelta(hours=1),
+    },
+    'flag-overdue-tasks': {
+        'task': 'workouts.tasks.flag_overdue_tasks',
+        'schedule': timedelta(hours=1),
+    },
+}
 CELERY_TIMEZONE = 'Asia/Dhaka'
 
 # REST Framework
@@ -130,10 +169,50 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'CORE.pagination.EstimatedCountLimitOffsetPagination',
     'PAGE_SIZE': 10,
+    # Scoped throttles: '<scope>' is per client (user, else IP), '<scope>_account'
+    # per target account (see account.throttles). Counters live in the default
+    # cache, so limits are per process unless REDIS_URL is set
+    'DEFAULT_THROTTLE_RATES': {
+        'verification_code': os.getenv('VERIFICATION_CODE_RATE', '10/hour'),
+        'verification_code_account': os.getenv('VERIFICATION_CODE_ACCOUNT_RATE', '5/hour'),
+        'verification_redeem': os.getenv('VERIFICATION_REDEEM_RATE', '30/hour'),
+        'verification_redeem_account': os.getenv('VERIFICATION_REDEEM_ACCOUNT_RATE', '10/hour'),
+    },
 }
 
+# Activity log writer (see account.audit): 'buffered', 'celery' or 'sync'
+ACTIVITY_LOG_MODE = os.getenv('ACTIVITY_LOG_MODE', 'sync' if TESTING else 'buffered')
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 1.0))
+# Months kept in activity_logs, and months kept at all (see account.partitions)
+ACTIVITY_LOG_HOT_MONTHS = int(os.getenv('ACTIVITY_LOG_HOT_MONTHS', 3))
+ACTIVITY_LOG_RETENTION_MONTHS = int(os.getenv('ACTIVITY_LOG_RETENTION_MONTHS', 24))
+
+# Pagination counts (see CORE.pagination.EstimatedCountLimitOffsetPagination)
+PAGINATION_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('PAGINATION_ESTIMATED_COUNT_THRESHOLD', 100000))
+PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 30))
+
+# Seconds a branch analytics report may be served from cache; any task or
+# plan change in the branch invalidates it sooner (see workouts.analytics)
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 300))
+# Seconds a cached read response may be served (see CORE.cache.CachedResponseMixin);
+# saves and deletes of the models it is built from retire it sooner
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+# Seconds a list's ETag validator (count and newest updated_at) may be served
+# from cache; tracked writes retire it sooner (see CORE.conditional)
+CONDITIONAL_VALIDATOR_CACHE_TTL = int(os.getenv('CONDITIONAL_VALIDATOR_CACHE_TTL', 60))
+# Seconds a member's agenda may stay cached; keys are per day and are
+# invalidated on task/plan changes, so this only bounds memory
+AGENDA_CACHE_TTL = int(os.getenv('AGENDA_CACHE_TTL', 60 * 60 * 24))
+# Seconds a create response is replayed for retries with the same
+# Idempotency-Key (see account.idempotency)
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+# Seconds a key stays claimed by a request that has not finished; a retry
+# after that takes the key over (e.g. when the first worker died)
+IDEMPOTENCY_KEY_LEASE = int(os.getenv('IDEMPOTENCY_KEY_LEASE', 60))
+
 # Simple JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -142,10 +221,21 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
+    'TOKEN_REFRESH_SERIALIZER': 'account.blacklist.FilteredTokenRefreshSerializer',
 }
 
+# Seconds between rebuilds of each process's blacklisted-JTI filter, and its
+# false-positive rate (see account.blacklist)
+TOKEN_BLACKLIST_FILTER_TTL = int(os.getenv('TOKEN_BLACKLIST_FILTER_TTL', 300))
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = float(os.getenv('TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.01))
+
+# Seconds a user's is_active / role / branch may be served from cache when
+# authenticating read requests from token claims (see account.authentication;
+# only with a shared cache, i.e. REDIS_URL)
+AUTH_STATE_CACHE_TTL = int(os.getenv('AUTH_STATE_CACHE_TTL', 60))
+
 # Email Settings
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True") == "True"
@@ -153,3 +243,15 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL")
 
+# Mail delivery (see account.mailer): 'queued', 'celery' or 'sync'
+EMAIL_DELIVERY_MODE = os.getenv('EMAIL_DELIVERY_MODE', 'sync' if TESTING else 'queued')
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 50))
+EMAIL_FLUSH_INTERVAL = float(os.getenv('EMAIL_FLUSH_INTERVAL', 1.0))
+# Retries per batch, waiting EMAIL_RETRY_BACKOFF * 2**n seconds before retry n+1
+EMAIL_SEND_RETRIES = int(os.getenv('EMAIL_SEND_RETRIES', 3))
+EMAIL_RETRY_BACKOFF = float(os.getenv('EMAIL_RETRY_BACKOFF', 2.0))
+
+# Email verification codes (see account.verification)
+VERIFICATION_CODE_LENGTH = int(os.getenv('VERIFICATION_CODE_LENGTH', 6))
+VERIFICATION_CODE_TTL = int(os.getenv('VERIFICATION_CODE_TTL', 60 * 10))
+VERIFICATION_CODE_MAX_ATTEMPTS = int(os.getenv('VERIFICATION_CODE_MAX_ATTEMPTS', 5))
@@ -6,6 +6,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .views import ResponseCacheStatsView
+
 schema_view = get_schema_view(
    openapi.Info(
       title="Test API",
@@ -24,6 +26,7 @@ urlpatterns = [
     path('auth/', include('account.urls')),
     path('gyms/', include('gyms.urls')),
     path('workouts/', include('workouts.urls')),
+    path('monitoring/cache/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
 
     # Swagger UI
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
@@ -0,0 +1,110 @@
+"""
+Save-time validation that skips what the caller already checked.
+
+Models that validate themselves in save() call `validate_on_save()` instead
+of `full_clean()`. It runs the same four steps as full_clean():
+
+- 'fields': per-field validation, including the existence query for every
+  foreign key (`clean_fields()`),
+- 'rules': the model's own business rules (`clean()`),
+- 'unique': unique and unique_together queries (`validate_unique()`),
+- 'constraints': Meta.constraints (`validate_constraints()`),
+
+minus any step the surrounding code declared with `prevalidated(...)` for
+that very instance. Serializers declare theirs with `prevalidated_invariants`
+(see PrevalidatedSaveMixin). Other saves inside the block, e.g. of related
+objects from signals or overridden save() methods, and saves outside any
+block (shell, admin, management commands) get the full set.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import ValidationError
+
+INVARIANTS = ('fields', 'rules', 'unique', 'constraints')
+
+_prevalidated = ContextVar('prevalidated', default=())
+
+
+class _Declaration:
+    """Steps skipped for one instance; a model class binds to the first new instance validated."""
+
+    def __init__(self, target, invariants):
+        self.invariants = invariants
+        if isinstance(target, type):
+            self.model, self.instance = target, None
+        else:
+            self.model, self.instance = type(target), target
+
+    def covers(self, instance):
+        if self.instance is None and isinstance(instance, self.model) and instance._state.adding:
+            self.instance = instance
+        return self.instance is instance
+
+
+@contextmanager
+def prevalidated(target, *invariants):
+    """
+    Saves of `target` inside this block skip the given validation steps.
+    `target` is a model instance, or a model class when the instance is
+    created inside the block (the first new instance of it validated).
+    """
+    unknown = set(invariants) - set(INVARIANTS)
+    if unknown:
+        raise ValueError(f'Unknown invariant(s): {", ".join(sorted(unknown))}')
+    token = _prevalidated.set(_prevalidated.get() + (_Declaration(target, frozenset(invariants)),))
+    try:
+        yield
+    finally:
+        _prevalidated.reset(token)
+
+
+def prevalidated_invariants(instance):
+    """The steps declared prevalidated for `instance` by the enclosing blocks."""
+    checked = frozenset()
+    for declaration in _prevalidated.get():
+        if declaration.covers(instance):
+            checked |= declaration.invariants
+    return checked
+
+
+class ValidateOnSaveMixin:
+    """Model mixin: full_clean() on save, minus prevalidated steps."""
+
+    def validate_on_save(self):
+        checked = prevalidated_invariants(self)
+        if not checked:
+            self.full_clean()
+            return
+
+        errors = {}
+        steps = (
+            ('fields', self.clean_fields),
+            ('rules', self.clean),
+            ('unique', self.validate_unique),
+            ('constraints', self.validate_constraints),
+        )
+        for invariant, step in steps:
+            if invariant in checked:
+                continue
+            try:
+                step()
+            except ValidationError as exc:
+                errors = exc.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
+
+
+class PrevalidatedSaveMixin:
+    """
+    Serializer mixin: `save()` runs inside `prevalidated()` with the
+    invariants listed in `prevalidated_invariants`, i.e. those the
+    serializer's own validation already covers. Only the instance being
+    updated, or the one being created, skips them.
+    """
+    prevalidated_invariants = ()
+
+    def save(self, **kwargs):
+        target = self.instance if self.instance is not None else self.Meta.model
+        with prevalidated(target, *self.prevalidated_invariants):
+            return super().save(**kwargs)
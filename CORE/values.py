@@ -0,0 +1,109 @@
+"""
+Read-only fast path for list endpoints.
+
+ModelSerializer spends most of a list response on per-row, per-field
+machinery: building model instances, resolving each field's source and
+wrapping the result. ValuesSerializer derives a column plan from the same
+serializer once, fetches exactly those columns with `values()` (joins come
+from the lookups) and builds plain dicts in the serializer's field order,
+formatting each value with the serializer field's own `to_representation`.
+The JSON is therefore the same as the serializer's, byte for byte.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+
+class ValuesSerializer:
+    """
+    Column plan for one read serializer.
+
+    `computed` maps output names whose source is a method or property to
+    (lookups, function): the function receives the looked-up values
+    positionally. Nested sources (`gym_branch.name`) are omitted from a row
+    when the relation is null, as DRF does for read-only fields.
+    """
+
+    def __init__(self, serializer_class, computed=None, fields=None):
+        computed = computed or {}
+        self.plan = []
+        self.lookups = []
+
+        for name, field in serializer_class().fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if name in computed:
+                sources, function = computed[name]
+                self.plan.append((name, tuple(sources), function, None, field.to_representation))
+                self.lookups.extend(sources)
+            elif isinstance(field, PrimaryKeyRelatedField):
+                # values() already yields the primary key
+                self.plan.append((name, (field.source,), None, None, None))
+                self.lookups.append(field.source)
+            elif isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+                raise ImproperlyConfigured(f'{serializer_class.__name__}.{name} cannot be read with values()')
+            else:
+                lookup = '__'.join(field.source_attrs)
+                guard = '__'.join(field.source_attrs[:-1]) or None
+                self.plan.append((name, (lookup,), None, guard, field.to_representation))
+                self.lookups.append(lookup)
+                if guard:
+                    self.lookups.append(guard)
+
+        self.lookups = list(dict.fromkeys(self.lookups))
+
+    def values(self, queryset, *extra):
+        return queryset.values(*dict.fromkeys([*self.lookups, *extra]))
+
+    def to_representation(self, row):
+        data = {}
+        for name, sources, function, guard, represent in self.plan:
+            if guard is not None and row[guard] is None:
+                continue
+            if function is not None:
+                value = function(*(row[source] for source in sources))
+            else:
+                value = row[sources[0]]
+            data[name] = value if value is None or represent is None else represent(value)
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class ValuesListMixin:
+    """
+    Serve the `list` action through ValuesSerializer.
+
+    The plan is built from `get_serializer_class()` for the list action, with
+    `values_computed` for method/property sources. `id` and `created_at` are
+    always fetched so keyset pagination can build its cursors.
+    """
+    values_computed = {}
+    values_serializer_enabled = True
+    values_pagination_fields = ('id', 'created_at')
+    _values_serializers = {}
+
+    def get_values_serializer(self):
+        serializer_class = self.get_serializer_class()
+        # Sparse fieldsets (see CORE.fieldsets) get a plan of their own
+        requested = getattr(self, 'get_requested_fields', lambda: None)()
+        fields = tuple(requested) if requested is not None else None
+        key = (type(self), serializer_class, fields)
+        if key not in self._values_serializers:
+            self._values_serializers[key] = ValuesSerializer(serializer_class, self.values_computed, fields)
+        return self._values_serializers[key]
+
+    def list(self, request, *args, **kwargs):
+        if not self.values_serializer_enabled:
+            return super().list(request, *args, **kwargs)
+
+        values_serializer = self.get_values_serializer()
+        queryset = values_serializer.values(
+            self.filter_queryset(self.get_queryset()), *self.values_pagination_fields
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serialize(page))
+        return Response(values_serializer.serialize(queryset))
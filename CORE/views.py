@@ -0,0 +1,16 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from account.authentication import ClaimsJWTAuthentication
+from account.permissions import IsAdmin
+from .cache import response_cache_stats
+
+
+class ResponseCacheStatsView(APIView):
+    """Hit/miss counters of the cached read endpoints - Admin only"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    def get(self, request):
+        return Response(response_cache_stats())
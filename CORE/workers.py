@@ -0,0 +1,114 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker:
+    """
+    In-process write-behind buffer.
+
+    Items passed to `put()` are queued and handed to `flush_callback` in
+    lists of up to `batch_size`, from a daemon thread, whenever a batch
+    fills up or `flush_interval` seconds pass. Whatever is still queued is
+    flushed on interpreter shutdown. If the queue is full, `put()` flushes
+    the item inline rather than dropping it.
+    """
+
+    def __init__(self, flush_callback, batch_size=100, flush_interval=1.0, max_queue_size=10000, name='batch-worker'):
+        self.flush_callback = flush_callback
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.name = name
+        self._lock = threading.Lock()
+        self._reset()
+        atexit.register(self.stop)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def put(self, item):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning('%s queue is full, flushing inline', self.name)
+            self._deliver([item])
+
+    def flush(self):
+        """Deliver everything queued so far from the calling thread."""
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            self._deliver(batch)
+
+    def stop(self):
+        """Stop the background thread and flush what is left."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            thread.join(timeout=self.flush_interval * 2 + 5)
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            # Forked child: the parent's thread and queue don't exist here
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._deliver(batch)
+
+    def _drain(self, block):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, batch):
+        # The worker thread owns its own DB connection; recycle it the way
+        # Django does between requests. Inline flushes run on the caller's.
+        in_worker = threading.current_thread() is self._thread
+        if in_worker:
+            close_old_connections()
+        try:
+            self.flush_callback(batch)
+        except Exception:
+            logger.exception('%s failed to flush %d item(s)', self.name, len(batch))
+        finally:
+            if in_worker:
+                close_old_connections()
@@ -0,0 +1,84 @@
+"""
+Activity log writer.
+
+Views call `log_activity()` instead of creating `ActivityLog` rows inline.
+How the row gets written depends on `ACTIVITY_LOG_MODE`:
+
+- 'buffered': queued in-process and bulk inserted by a background thread
+  (see CORE.workers.BatchWorker), flushed on shutdown.
+- 'celery': queued in-process the same way, but each batch is handed to
+  the `write_activity_log_batch` Celery task instead of inserted locally.
+- 'sync': inserted immediately, inside the request. Used by the tests.
+"""
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from CORE.workers import BatchWorker
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+def log_activity(user, action, model_name, object_id=None, details=None, ip_address=None):
+    entry = {
+        'user_id': user.pk if user is not None else None,
+        'action': action,
+        'model_name': model_name,
+        'object_id': object_id,
+        'details': details,
+        'ip_address': ip_address,
+        'created_at': timezone.now(),
+    }
+
+    if settings.ACTIVITY_LOG_MODE == 'sync':
+        write_activity_logs([entry])
+    else:
+        writer.put(entry)
+
+
+def write_activity_logs(entries):
+    """Insert a batch of log entries, skipping any that no longer fit (e.g. a deleted user)."""
+    rows = [ActivityLog(**entry) for entry in entries]
+    try:
+        with transaction.atomic():
+            ActivityLog.objects.bulk_create(rows, batch_size=settings.ACTIVITY_LOG_BATCH_SIZE)
+    except IntegrityError:
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    row.save()
+            except IntegrityError:
+                logger.warning('Dropping activity log entry %s %s for user %s', row.action, row.model_name, row.user_id)
+
+
+def flush_activity_logs():
+    """Write everything buffered in this process now."""
+    writer.flush()
+
+
+def _flush(entries):
+    if settings.ACTIVITY_LOG_MODE == 'celery':
+        from .tasks import write_activity_log_batch
+        write_activity_log_batch.delay([encode_entry(entry) for entry in entries])
+    else:
+        write_activity_logs(entries)
+
+
+def encode_entry(entry):
+    return {**entry, 'created_at': entry['created_at'].isoformat()}
+
+
+def decode_entry(entry):
+    return {**entry, 'created_at': parse_datetime(entry['created_at'])}
+
+
+writer = BatchWorker(
+    _flush,
+    batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval=settings.ACTIVITY_LOG_FLUSH_INTERVAL,
+    name='activity-log-writer',
+)
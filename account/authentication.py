@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from CORE.cache import cache_is_shared
+from .models import User
+
+AUTH_STATE_CACHE_KEY = 'auth:state:{}'
+
+
+def add_claims(token, user):
+    """Embed the claims ClaimsJWTAuthentication needs to skip the user lookup."""
+    token['role'] = user.role
+    token['gym_branch_id'] = user.gym_branch_id
+    return token
+
+
+def auth_state(user):
+    return {'is_active': user.is_active, 'role': user.role, 'gym_branch_id': user.gym_branch_id}
+
+
+def get_auth_state(user_id):
+    """
+    Current is_active / role / branch of a user, cached for AUTH_STATE_CACHE_TTL
+    seconds and refreshed by signals whenever the user row is saved or deleted.
+    """
+    key = AUTH_STATE_CACHE_KEY.format(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = (
+            User.objects.filter(pk=user_id).values('is_active', 'role', 'gym_branch_id').first()
+            or {'is_active': False, 'role': None, 'gym_branch_id': None}
+        )
+        cache.set(key, state, settings.AUTH_STATE_CACHE_TTL)
+    return state
+
+
+def set_auth_state(user):
+    cache.set(AUTH_STATE_CACHE_KEY.format(user.pk), auth_state(user), settings.AUTH_STATE_CACHE_TTL)
+
+
+def forget_auth_state(user_id):
+    cache.delete(AUTH_STATE_CACHE_KEY.format(user_id))
+
+
+class ClaimsTokenUser(TokenUser):
+    """
+    Stateless `request.user` built from access-token claims.
+    Carries the id, role and gym_branch_id that permissions and scoped
+    querysets need; the branch row itself is only loaded if asked for.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def gym_branch_id(self):
+        return self.token.get('gym_branch_id')
+
+    @cached_property
+    def gym_branch(self):
+        from gyms.models import GymBranch
+        if self.gym_branch_id is None:
+            return None
+        return GymBranch.objects.get(pk=self.gym_branch_id)
+
+    @property
+    def is_admin(self):
+        return self.role == 'ADMIN'
+
+    @property
+    def is_manager(self):
+        return self.role == 'MANAGER'
+
+    @property
+    def is_trainer(self):
+        return self.role == 'TRAINER'
+
+    @property
+    def is_member(self):
+        return self.role == 'MEMBER'
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that skips the per-request user lookup on reads.
+
+    For GET/HEAD/OPTIONS with a token that carries `role` and
+    `gym_branch_id` claims, `request.user` is a ClaimsTokenUser. The claims
+    are checked against the cached auth state, so deactivation is honoured
+    within AUTH_STATE_CACHE_TTL at most (immediately when made through a
+    model save), and a role or branch change sends the request down the
+    normal database path. Writes always load the real User.
+
+    The auth state cache must be shared by every process for a save in one
+    to reach the others; with a process-local cache (no REDIS_URL) reads
+    load the User as well.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        if request.method in SAFE_METHODS and cache_is_shared():
+            user = self.get_token_user(validated_token)
+            if user is not None:
+                return user, validated_token
+
+        return self.get_user(validated_token), validated_token
+
+    def get_token_user(self, validated_token):
+        if 'role' not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+            return None
+
+        user = ClaimsTokenUser(validated_token)
+        state = get_auth_state(user.id)
+        if not state['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        if state['role'] != user.role or state['gym_branch_id'] != user.gym_branch_id:
+            # Claims are stale; fall back to the database user
+            return None
+        return user
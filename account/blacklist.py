@@ -0,0 +1,126 @@
+"""
+Refresh-token blacklist lookups without a query per refresh.
+
+Every process keeps a Bloom filter of the JTIs blacklisted when it was last
+built (rebuilt from the database every TOKEN_BLACKLIST_FILTER_TTL seconds).
+A token blacklisted after that also gets a short-lived cache marker, set as
+its BlacklistedToken row is saved, so the two together cover every
+blacklisted token: a JTI found in neither is not blacklisted and the
+refresh needs no blacklist query. A hit in either is confirmed against the
+database, so false positives cost one query, as before.
+
+The markers only cover other processes when the cache is shared (Redis).
+With a process-local cache every refresh queries the blacklist, as
+simplejwt does.
+
+Expired tokens are removed by the `purge_expired_tokens` command.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from CORE.cache import cache_is_shared
+
+BLACKLISTED_JTI_KEY = 'token-blacklist:jti:{}'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)."""
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class BlacklistFilter:
+    """Process-local Bloom filter of blacklisted, unexpired JTIs."""
+
+    def __init__(self):
+        self.bloom = None
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        jtis = list(
+            BlacklistedToken.objects
+            .filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+            .iterator()
+        )
+        # Headroom for JTIs added locally before the next rebuild
+        bloom = BloomFilter(2 * len(jtis) + 1024, settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        return bloom
+
+    def current(self):
+        stale = self.built_at is None or time.monotonic() - self.built_at > settings.TOKEN_BLACKLIST_FILTER_TTL
+        if stale:
+            with self.lock:
+                if self.built_at is None or time.monotonic() - self.built_at > settings.TOKEN_BLACKLIST_FILTER_TTL:
+                    # Timestamp first: markers set while building are still inside their TTL
+                    built_at = time.monotonic()
+                    self.bloom = self.build()
+                    self.built_at = built_at
+        return self.bloom
+
+    def add(self, jti):
+        if self.bloom is not None:
+            self.bloom.add(jti)
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+            self.built_at = None
+
+    def might_contain(self, jti):
+        return jti in self.current() or cache.get(BLACKLISTED_JTI_KEY.format(jti)) is not None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def remember_blacklisted(jti, expires_at):
+    """Record a new blacklist entry for filters built before it."""
+    blacklist_filter.add(jti)
+    remaining = (expires_at - timezone.now()).total_seconds()
+    if remaining > 0:
+        # Outlive every process's filter, but not the token itself
+        cache.set(BLACKLISTED_JTI_KEY.format(jti), 1, min(remaining, 2 * settings.TOKEN_BLACKLIST_FILTER_TTL))
+
+
+class FilteredRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if cache_is_shared() and not blacklist_filter.might_contain(jti):
+            return
+        super().check_blacklist()
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """TokenRefreshSerializer that consults the blacklist filter first."""
+    token_class = FilteredRefreshToken
@@ -0,0 +1,124 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client that may retry a POST (timeouts, dropped connections) sends an
+`Idempotency-Key` header. The first request with a given key claims it by
+inserting a row into `idempotency_keys`; the (user, key) unique constraint
+makes the claim atomic, so of several concurrent duplicates exactly one runs
+the view. Once it succeeds its status and body are stored and every retry
+within `IDEMPOTENCY_KEY_TTL` gets them back, marked `Idempotent-Replayed:
+true`, without the view running again.
+
+- A retry that arrives while the first request is still running gets 409
+  with Retry-After. The claim is only a short lease
+  (`IDEMPOTENCY_KEY_LEASE`), so a worker that dies mid-request blocks the
+  key for seconds, not for the whole TTL; the next retry takes it over.
+- Reusing a key for a different method, path or body gets 422.
+- A request that fails (error response or exception) releases its claim,
+  since nothing was created, and the same key may be sent again.
+
+Requests without the header, or from anonymous callers, are not tracked.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{request.method}\n{request.path}\n{body}'.encode()).hexdigest()
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Insert an in-progress row for (user, key) under a short lease. Returns
+    (row, True) if this request owns the key now, else (existing row, False).
+    """
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                claim = IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE),
+                )
+            return claim, True
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if existing is None:
+                # Released between our insert and read; try again
+                continue
+            if existing.expires_at > now:
+                return existing, False
+            # Expired response or abandoned claim: only one retry may take it over
+            IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=now).delete()
+    return IdempotencyKey.objects.filter(user=user, key=key).first(), False
+
+
+class IdempotentCreateMixin:
+    """
+    ViewSet mixin: `create()` honours the Idempotency-Key header. List it
+    first so the replay happens before any other create logic.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        record, claimed = claim_key(request.user, key, fingerprint)
+        if not claimed:
+            return self.idempotent_replay(record, fingerprint)
+
+        # By pk: if our lease ran out and a retry took the key over, its row is not ours
+        claim = IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True)
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            claim.delete()
+            raise
+
+        if response.status_code >= 400:
+            claim.delete()
+        else:
+            claim.update(
+                status_code=response.status_code, response_body=response.data,
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            )
+        return response
+
+    def idempotent_replay(self, existing, fingerprint):
+        if existing is not None and existing.fingerprint != fingerprint:
+            return Response(
+                {'detail': 'This Idempotency-Key was already used for a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if existing is None or existing.status_code is None:
+            return Response(
+                {'detail': 'A request with this Idempotency-Key is still being processed.'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': '1'},
+            )
+        headers = self.get_success_headers(existing.response_body or {})
+        headers['Idempotent-Replayed'] = 'true'
+        return Response(existing.response_body, status=existing.status_code, headers=headers)
@@ -0,0 +1,133 @@
+"""
+Outgoing mail queue.
+
+Views call `queue_mail()` instead of sending inline, so a request never
+waits on SMTP. How the message is delivered depends on `EMAIL_DELIVERY_MODE`:
+
+- 'queued': queued in-process and sent by a background thread (see
+  CORE.workers.BatchWorker), one SMTP connection per batch.
+- 'celery': queued in-process the same way, but each batch is handed to the
+  `send_mail_batch` Celery task.
+- 'sync': sent immediately, inside the request. Used by the tests.
+
+Messages that fail are retried with exponential backoff
+(`EMAIL_SEND_RETRIES`, `EMAIL_RETRY_BACKOFF`) on a fresh connection.
+Messages the server rejects permanently (refused recipients, 5xx replies)
+are logged and not retried; the rest of their batch is still sent.
+"""
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from CORE.workers import BatchWorker
+
+logger = logging.getLogger(__name__)
+
+# Errors worth another attempt; anything else is a bug in the message
+RETRYABLE_ERRORS = (smtplib.SMTPException, OSError)
+
+
+def queue_mail(subject, body, to):
+    message = {'subject': subject, 'body': body, 'to': list(to)}
+
+    if settings.EMAIL_DELIVERY_MODE == 'sync':
+        send_messages([message])
+    else:
+        mailer.put(message)
+
+
+def send_messages(messages):
+    """
+    Send a batch over one connection, retrying failures with backoff.
+    Returns the messages that could not be sent.
+    """
+    pending = list(messages)
+    rejected = []
+    for attempt in range(settings.EMAIL_SEND_RETRIES + 1):
+        if attempt:
+            time.sleep(settings.EMAIL_RETRY_BACKOFF * 2 ** (attempt - 1))
+        pending, refused = _send_over_connection(pending)
+        rejected.extend(refused)
+        if not pending:
+            return rejected
+
+    for message in pending:
+        logger.error('Giving up on mail %r to %s after %d attempt(s)',
+                     message['subject'], ', '.join(message['to']), settings.EMAIL_SEND_RETRIES + 1)
+    return rejected + pending
+
+
+def _connection_lost(exc):
+    # SMTPException subclasses OSError; of those only a disconnect loses the connection
+    return isinstance(exc, smtplib.SMTPServerDisconnected) or not isinstance(exc, smtplib.SMTPException)
+
+
+def _is_permanent(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def _send_over_connection(messages):
+    """Returns (messages to retry, messages rejected for good)."""
+    connection = get_connection()
+    try:
+        connection.open()
+    except RETRYABLE_ERRORS:
+        logger.warning('Could not open a mail connection for %d message(s)', len(messages), exc_info=True)
+        return messages, []
+
+    failed = []
+    rejected = []
+    try:
+        for index, message in enumerate(messages):
+            email = EmailMessage(
+                message['subject'], message['body'], settings.DEFAULT_FROM_EMAIL, message['to'],
+                connection=connection,
+            )
+            try:
+                email.send()
+            except OSError as exc:
+                if _connection_lost(exc):
+                    logger.warning('Mail connection lost after %d message(s)', index, exc_info=True)
+                    # Retry this and the rest on the next attempt's connection
+                    failed.extend(messages[index:])
+                    break
+                # A reply about this message only; the rest of the batch goes on
+                if _is_permanent(exc):
+                    logger.error('Mail %r to %s rejected', message['subject'], ', '.join(message['to']),
+                                 exc_info=True)
+                    rejected.append(message)
+                else:
+                    logger.warning('Sending mail to %s failed', ', '.join(message['to']), exc_info=True)
+                    failed.append(message)
+    finally:
+        try:
+            connection.close()
+        except RETRYABLE_ERRORS:
+            pass
+    return failed, rejected
+
+
+def flush_mail():
+    """Send everything queued in this process now."""
+    mailer.flush()
+
+
+def _flush(messages):
+    if settings.EMAIL_DELIVERY_MODE == 'celery':
+        from .tasks import send_mail_batch
+        send_mail_batch.delay(messages)
+    else:
+        send_messages(messages)
+
+
+mailer = BatchWorker(
+    _flush,
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    flush_interval=settings.EMAIL_FLUSH_INTERVAL,
+    name='mail-sender',
+)
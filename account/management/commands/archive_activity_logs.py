@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from account.partitions import (
+    add_months,
+    archive_month,
+    drop_period_table,
+    list_period_tables,
+    rollup_pending_days,
+)
+from account.models import ActivityLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Rolls up finished days of activity logs, moves months older than the hot window '
+        'into monthly archive tables and drops archive tables past the retention period.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hot-months', type=int, default=settings.ACTIVITY_LOG_HOT_MONTHS,
+                            help='Months (including the current one) kept in activity_logs.')
+        parser.add_argument('--retention-months', type=int, default=settings.ACTIVITY_LOG_RETENTION_MONTHS,
+                            help='Archive tables older than this many months are dropped.')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be archived or dropped without changing anything.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        today = timezone.localdate()
+        hot_start = add_months(today.year, today.month, -(options['hot_months'] - 1))
+        retention_start = add_months(today.year, today.month, -(options['retention_months'] - 1))
+        dry_run = options['dry_run']
+
+        # 1. Summaries first, so no raw row leaves the hot table un-rolled-up
+        if not dry_run:
+            days = rollup_pending_days(hot_months=options['hot_months'])
+            self.stdout.write(f'Rolled up {days} day(s).')
+
+        # 2. Move closed months out of the hot table
+        oldest = ActivityLog.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if oldest is not None:
+            oldest = timezone.localtime(oldest)
+            period = (oldest.year, oldest.month)
+            while period < hot_start:
+                if dry_run:
+                    self.stdout.write(f'Would archive {period[0]:04d}-{period[1]:02d}.')
+                else:
+                    moved = archive_month(*period, chunk_size=options['chunk_size'])
+                    if moved:
+                        self.stdout.write(f'Archived {moved} row(s) from {period[0]:04d}-{period[1]:02d}.')
+                period = add_months(*period, 1)
+
+        # 3. Drop archive tables past retention
+        for year, month, table in list_period_tables():
+            if (year, month) >= retention_start:
+                continue
+            if dry_run:
+                self.stdout.write(f'Would drop {table}.')
+            else:
+                drop_period_table(table)
+                self.stdout.write(f'Dropped {table}.')
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s.'))
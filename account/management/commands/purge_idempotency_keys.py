@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from account.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired idempotency keys in short chunked transactions, walking '
+        'the expires_at index. Rows locked by a concurrent retry are skipped and '
+        'picked up by the next run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Keys deleted per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many keys would be deleted without changing anything.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        expired = IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).order_by('expires_at')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Would delete {expired.count()} idempotency key(s) in {time.monotonic() - started:.1f}s.'
+            ))
+            return
+
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    expired.select_for_update(skip_locked=True)
+                    .values_list('id', flat=True)[:options['chunk_size']]
+                )
+                if not ids:
+                    break
+                deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} idempotency key(s) in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_user_is_verified'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['-created_at', '-id'], name='activity_lo_created_fc6e69_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_alter_activitylog_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action', models.CharField(choices=[('CREATE', 'Create'), ('UPDATE', 'Update'), ('DELETE', 'Delete'), ('LOGIN', 'Login'), ('LOGOUT', 'Logout')], max_length=20)),
+                ('model_name', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'activity_log_daily_rollups',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='activity_lo_day_f61e2b_idx'), models.Index(fields=['user', 'day'], name='activity_lo_user_id_98e907_idx')],
+            },
+        ),
+    ]
@@ -1,9 +1,16 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 import uuid
 
+from CORE.validation import ValidateOnSaveMixin
+from gyms.models import GymBranchStats, MAX_TRAINERS_PER_BRANCH
+
+# Marker for "branch counter state not loaded" (deferred fields)
+UNKNOWN = object()
+
 
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication"""
@@ -24,7 +31,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(ValidateOnSaveMixin, AbstractBaseUser, PermissionsMixin):
     """Custom User model with role-based access"""
 
     ROLE_CHOICES = [
@@ -88,14 +95,6 @@ class User(AbstractBaseUser, PermissionsMixin):
         if self.role != 'ADMIN' and not self.gym_branch:
             raise ValidationError({'gym_branch': 'This role must be assigned to a branch.'})
 
-        # Final safeguard for Trainer limit
-        if self.role == 'TRAINER' and self.gym_branch:
-            qs = User.objects.filter(gym_branch=self.gym_branch, role='TRAINER')
-            if self.pk:
-                qs = qs.exclude(pk=self.pk)
-            if qs.count() >= 3:
-                raise ValidationError('A gym branch cannot have more than 3 trainers.')
-
         # Super Admin should not have a gym branch
         if self.role == 'ADMIN' and self.gym_branch:
             raise ValidationError({
@@ -109,8 +108,50 @@ class User(AbstractBaseUser, PermissionsMixin):
             })
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        self.validate_on_save()
+        previous = self.previous_counter_key()
+        current = self.counter_key()
+        with transaction.atomic():
+            # Keep the branch trainer/member counters in the same transaction.
+            # Taking the counter first makes the trainer limit race-free: the
+            # conditional UPDATE is the check, and it holds the row lock.
+            if previous != current:
+                if current and not GymBranchStats.adjust(*current, 1):
+                    raise ValidationError(
+                        f'A gym branch cannot have more than {MAX_TRAINERS_PER_BRANCH} trainers.'
+                    )
+                if previous:
+                    GymBranchStats.adjust(*previous, -1)
+            super().save(*args, **kwargs)
+        self._counted_as = current
+
+    # Branch counter bookkeeping (see gyms.models.GymBranchStats)
+    _counted_as = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if instance.get_deferred_fields() & {'is_active', 'role', 'gym_branch_id'}:
+            instance._counted_as = UNKNOWN
+        else:
+            instance._counted_as = instance.counter_key()
+        return instance
+
+    def counter_key(self):
+        """(branch id, role) this user counts towards in GymBranchStats, or None"""
+        if self.is_active and self.gym_branch_id and self.role in GymBranchStats.COUNTED_ROLES:
+            return self.gym_branch_id, self.role
+        return None
+
+    def previous_counter_key(self):
+        """counter_key() as of the last load or save"""
+        if self._counted_as is UNKNOWN:
+            stored = User.objects.filter(pk=self.pk).values('is_active', 'role', 'gym_branch_id').first()
+            self._counted_as = None
+            if stored and stored['is_active'] and stored['gym_branch_id'] \
+                    and stored['role'] in GymBranchStats.COUNTED_ROLES:
+                self._counted_as = (stored['gym_branch_id'], stored['role'])
+        return self._counted_as
 
     # Helper properties
     @property
@@ -131,7 +172,11 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     @property
     def get_full_name(self):
-        return f"{self.first_name} {self.last_name}"
+        return self.format_full_name(self.first_name, self.last_name)
+
+    @staticmethod
+    def format_full_name(first_name, last_name):
+        return f"{first_name} {last_name}"
 
     @property
     def get_role_display(self):
@@ -168,7 +213,8 @@ class ActivityLog(models.Model):
     object_id = models.PositiveIntegerField(null=True, blank=True)
     details = models.JSONField(null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered writer inserts it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'activity_logs'
@@ -176,12 +222,68 @@ class ActivityLog(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['model_name', 'action']),
+            models.Index(fields=['-created_at', '-id']),
         ]
 
     def __str__(self):
         return f"{self.user} - {self.action} {self.model_name} at {self.created_at}"
 
 
+class ActivityLogDailyRollup(models.Model):
+    """Per-day activity counts, so long-range audit summaries never read raw logs"""
+
+    day = models.DateField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='activity_rollups'
+    )
+    action = models.CharField(max_length=20, choices=ActivityLog.ACTION_CHOICES)
+    model_name = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'activity_log_daily_rollups'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['user', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.user} - {self.action} {self.model_name}: {self.count}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a POST sent with an Idempotency-Key header, per user
+    and key (see account.idempotency). `status_code` is null while the first
+    request is still running; until then `expires_at` is only a short lease.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Hash of method, path and body, so a key cannot be replayed for another request
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key} ({self.status_code or 'in progress'})"
+
+
 class EmailVerificationCode(models.Model):
     PURPOSE_CHOICES = [
         ("signup", "Signup"),
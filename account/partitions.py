@@ -0,0 +1,155 @@
+"""
+Monthly archive tables and daily rollups for activity logs.
+
+`activity_logs` only keeps the most recent `ACTIVITY_LOG_HOT_MONTHS` months.
+Older months are moved, in short chunked transactions, into one plain table
+per month (`activity_logs_YYYY_MM`, same columns, copied by name; columns
+added later are added to existing period tables). Those period tables are
+dropped whole once they fall outside `ACTIVITY_LOG_RETENTION_MONTHS`, which
+is a cheap DROP TABLE rather than a long DELETE. The scheme uses only
+portable SQL, so it behaves the same on PostgreSQL and SQLite.
+
+Before raw rows leave the hot table they are summarised into
+`ActivityLogDailyRollup`, one row per (day, user, action, model_name).
+"""
+import re
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ActivityLog, ActivityLogDailyRollup
+
+PERIOD_TABLE_PATTERN = re.compile(rf'^{ActivityLog._meta.db_table}_(\d{{4}})_(\d{{2}})$')
+
+
+def add_months(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def month_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def period_table_name(year, month):
+    return f'{ActivityLog._meta.db_table}_{year:04d}_{month:02d}'
+
+
+def list_period_tables():
+    """(year, month, table) for every existing period table, oldest first."""
+    periods = []
+    for table in connection.introspection.table_names():
+        match = PERIOD_TABLE_PATTERN.match(table)
+        if match:
+            periods.append((int(match.group(1)), int(match.group(2)), table))
+    return sorted(periods)
+
+
+def column_list():
+    """The model's columns, quoted, so copies never depend on physical column order."""
+    qn = connection.ops.quote_name
+    return ', '.join(qn(field.column) for field in ActivityLog._meta.concrete_fields)
+
+
+def ensure_period_table(year, month):
+    table = period_table_name(year, month)
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {qn(table)} AS '
+            f'SELECT {column_list()} FROM {qn(ActivityLog._meta.db_table)} WHERE 1 = 0'
+        )
+        existing = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+        for field in ActivityLog._meta.concrete_fields:
+            if field.column not in existing:
+                # Added to activity_logs after this month was first archived
+                cursor.execute(f'ALTER TABLE {qn(table)} ADD COLUMN {qn(field.column)} {field.db_type(connection)}')
+    return table
+
+
+def archive_month(year, month, chunk_size=5000):
+    """Move one month of logs out of the hot table. Returns the number of rows moved."""
+    start = month_start(year, month)
+    end = month_start(*add_months(year, month, 1))
+    rows = ActivityLog.objects.filter(created_at__gte=start, created_at__lt=end).order_by()
+    if not rows.exists():
+        return 0
+
+    qn = connection.ops.quote_name
+    table = qn(ensure_period_table(year, month))
+    hot = qn(ActivityLog._meta.db_table)
+    columns = column_list()
+    moved = 0
+    while True:
+        # One short transaction per chunk keeps locks brief
+        with transaction.atomic():
+            ids = list(rows.values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {hot} WHERE id IN ({placeholders})', ids
+                )
+            ActivityLog.objects.filter(id__in=ids).delete()
+        moved += len(ids)
+    return moved
+
+
+def drop_period_table(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {connection.ops.quote_name(table)}')
+
+
+def rollup_day(day):
+    """(Re)compute the rollup rows for one local day from the hot table."""
+    counts = (
+        ActivityLog.objects
+        .filter(created_at__gte=day_start(day), created_at__lt=day_start(day + timedelta(days=1)))
+        .order_by()
+        .values('user_id', 'action', 'model_name')
+        .annotate(count=Count('id'))
+    )
+    with transaction.atomic():
+        ActivityLogDailyRollup.objects.filter(day=day).delete()
+        ActivityLogDailyRollup.objects.bulk_create([
+            ActivityLogDailyRollup(day=day, **row) for row in counts
+        ])
+
+
+def rollup_pending_days(until=None, hot_months=None):
+    """
+    Roll up every finished day not yet summarised, up to and including
+    `until` (default: yesterday). The last rolled-up day is recomputed in
+    case buffered writes landed after it was first summarised, unless its
+    month is outside the hot window (`hot_months`, default
+    ACTIVITY_LOG_HOT_MONTHS) and its rows may already be archived.
+    Returns the number of days processed.
+    """
+    today = timezone.localdate()
+    until = until or today - timedelta(days=1)
+    hot_start = add_months(today.year, today.month, -((hot_months or settings.ACTIVITY_LOG_HOT_MONTHS) - 1))
+    last = ActivityLogDailyRollup.objects.aggregate(last=Max('day'))['last']
+    if last is None:
+        first = ActivityLog.objects.aggregate(first=Min(TruncDate('created_at')))['first']
+        if first is None:
+            return 0
+    elif (last.year, last.month) >= hot_start:
+        first = last
+    else:
+        first = last + timedelta(days=1)
+
+    day, days = first, 0
+    while day <= until:
+        rollup_day(day)
+        day += timedelta(days=1)
+        days += 1
+    return days
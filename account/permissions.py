@@ -37,11 +37,11 @@ class CanManageUsers(permissions.BasePermission):
         # Manager can only access users in their specific branch
         if request.user.role == 'MANAGER':
             # Check if the target user belongs to the manager's branch
-            return obj.gym_branch == request.user.gym_branch
+            return obj.gym_branch_id == request.user.gym_branch_id
 
         # Trainer can only access members in their specific branch
         if request.user.role == 'TRAINER':
             # Check if the target user belongs to the trainer's branch and is a member
-            return obj.gym_branch == request.user.gym_branch and obj.role == 'MEMBER'
+            return obj.gym_branch_id == request.user.gym_branch_id and obj.role == 'MEMBER'
 
         return False
\ No newline at end of file
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .models import EmailVerificationCode, User
+from CORE.validation import PrevalidatedSaveMixin
 
 
 class UserListSerializer(serializers.ModelSerializer):
@@ -13,17 +15,30 @@ class UserListSerializer(serializers.ModelSerializer):
                   'created_at']
 
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(PrevalidatedSaveMixin, serializers.ModelSerializer):
     """
     Serializer for creating users.
     Handles strict validation for Branch limits and Hierarchy.
     """
+    # Field, email uniqueness (of the normalized address, see validate_email)
+    # and User.clean() checks all happen in validation; save() still takes
+    # the trainer counter (see User.save)
+    prevalidated_invariants = ('fields', 'unique', 'rules')
+
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
 
     class Meta:
         model = User
         fields = ['email', 'password', 'role', 'first_name', 'last_name', 'gym_branch', 'phone_number', 'gender']
 
+    def validate_email(self, value):
+        # create_user() lowercases the domain, so the UniqueValidator check on
+        # the raw address is not enough when normalizing changes it
+        email = User.objects.normalize_email(value)
+        if email != value and User.objects.filter(email=email).exists():
+            raise serializers.ValidationError('user with this email already exists.')
+        return email
+
     def validate(self, attrs):
         request = self.context.get('request')
         user = request.user
@@ -47,7 +62,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Managers can only create Trainers or Members.")
 
             # Manager cannot assign users to other branches
-            if target_branch and target_branch != user.gym_branch:
+            if target_branch and target_branch.pk != user.gym_branch_id:
                 raise serializers.ValidationError({"gym_branch": "You cannot create users for another branch."})
 
             # Force the branch to be the Manager's branch
@@ -61,7 +76,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Trainers can only create members.")
 
             # Trainer cannot assign users to other branches
-            if target_branch and target_branch != user.gym_branch:
+            if target_branch and target_branch.pk != user.gym_branch_id:
                 raise serializers.ValidationError({"gym_branch": "You cannot create users for another branch."})
 
             # Force the branch to be the Trainer's branch
@@ -71,18 +86,24 @@ class UserCreateSerializer(serializers.ModelSerializer):
         else:
             raise serializers.ValidationError("You do not have permission to create users.")
 
-        # --- Business Rule: Max 3 Trainers per Branch ---
-        if new_role == 'TRAINER' and target_branch:
-            trainer_count = User.objects.filter(gym_branch=target_branch, role='TRAINER').count()
-            if trainer_count >= 3:
-                raise serializers.ValidationError("This branch already has the maximum of 3 trainers.")
+        # Model rules (User.clean), checked here so save() can skip them
+        if new_role == 'ADMIN' and target_branch:
+            raise serializers.ValidationError({'gym_branch': 'Super Admin cannot belong to a branch.'})
+        if new_role != 'ADMIN' and not target_branch:
+            raise serializers.ValidationError({'gym_branch': 'This role must be assigned to a branch.'})
+
+        # Business Rule: Max 3 Trainers per Branch is enforced by User.save(),
+        # atomically against the branch counter (see GymBranchStats.adjust)
 
         return attrs
 
     def create(self, validated_data):
         # Since Admin/Manager creates this, we auto-verify the account
         validated_data['is_verified'] = True
-        return User.objects.create_user(**validated_data)
+        try:
+            return User.objects.create_user(**validated_data)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
 
 
 class CustomTokenObtainPairSerializer(serializers.Serializer):
@@ -102,11 +123,14 @@ class CustomTokenObtainPairSerializer(serializers.Serializer):
         return {'user': user}
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(PrevalidatedSaveMixin, serializers.ModelSerializer):
     """
     Serializer for updating users.
     Allows updating of user details including phone number.
     """
+    # Role/branch combinations are left to User.clean()
+    prevalidated_invariants = ('fields', 'unique')
+
     class Meta:
         model = User
         fields = ['email', 'role', 'first_name', 'last_name', 'gym_branch', 'phone_number', 'gender', 'is_active']
@@ -124,7 +148,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         elif user.role == 'MANAGER':
             # Manager can only update users in their own branch
             target_obj = self.instance  # The user being updated
-            if target_obj and target_obj.gym_branch != user.gym_branch:
+            if target_obj and target_obj.gym_branch_id != user.gym_branch_id:
                 raise serializers.ValidationError("You can only update users in your own branch.")
 
             # Manager cannot change role to ADMIN or MANAGER
@@ -135,7 +159,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             # Trainer can only update members in their own branch
             target_obj = self.instance  # The user being updated
             if target_obj:
-                if target_obj.gym_branch != user.gym_branch:
+                if target_obj.gym_branch_id != user.gym_branch_id:
                     raise serializers.ValidationError("You can only update users in your own branch.")
 
                 if target_obj.role != 'MEMBER':
@@ -150,7 +174,36 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
         return attrs
 
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+
 
 class PasswordChangeSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
-    new_password = serializers.CharField(required=True, validators=[validate_password])
\ No newline at end of file
+    new_password = serializers.CharField(required=True, validators=[validate_password])
+
+
+class VerificationCodeRequestSerializer(serializers.Serializer):
+    purpose = serializers.ChoiceField(choices=EmailVerificationCode.PURPOSE_CHOICES)
+    email = serializers.EmailField(required=False)
+
+    def validate(self, attrs):
+        # Password resets are requested signed out, by email
+        if attrs['purpose'] == 'password_reset' and not attrs.get('email'):
+            raise serializers.ValidationError({'email': 'This field is required for password resets.'})
+        return attrs
+
+
+class VerificationCodeRedeemSerializer(VerificationCodeRequestSerializer):
+    token = serializers.UUIDField()
+    code = serializers.CharField(max_length=12)
+    new_password = serializers.CharField(required=False, validators=[validate_password])
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs['purpose'] == 'password_reset' and not attrs.get('new_password'):
+            raise serializers.ValidationError({'new_password': 'This field is required for password resets.'})
+        return attrs
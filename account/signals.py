@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from CORE.cache import track_model_changes
+from gyms.models import GymBranchStats
+from .authentication import forget_auth_state, set_auth_state
+from .blacklist import remember_blacklisted
+from .models import User
+
+track_model_changes(User)
+
+
+@receiver(post_save, sender=User)
+def refresh_auth_state(sender, instance, **kwargs):
+    set_auth_state(instance)
+
+
+@receiver(post_delete, sender=User)
+def drop_auth_state(sender, instance, **kwargs):
+    forget_auth_state(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def release_branch_counter(sender, instance, **kwargs):
+    # Runs inside the deletion's transaction
+    counted = instance.previous_counter_key()
+    if counted:
+        GymBranchStats.adjust(*counted, -1)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def note_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        remember_blacklisted(instance.token.jti, instance.token.expires_at)
@@ -0,0 +1,35 @@
+from celery import shared_task
+from django.core.management import call_command
+
+from .audit import decode_entry, write_activity_logs
+from .mailer import send_messages
+
+
+@shared_task
+def write_activity_log_batch(entries):
+    write_activity_logs([decode_entry(entry) for entry in entries])
+
+
+@shared_task
+def send_mail_batch(messages):
+    send_messages(messages)
+
+
+@shared_task
+def archive_activity_logs():
+    call_command('archive_activity_logs')
+
+
+@shared_task
+def purge_expired_tokens():
+    call_command('purge_expired_tokens')
+
+
+@shared_task
+def purge_verification_codes():
+    call_command('purge_verification_codes')
+
+
+@shared_task
+def purge_idempotency_keys():
+    call_command('purge_idempotency_keys')
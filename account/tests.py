@@ -0,0 +1,693 @@
+import copy
+import json
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from CORE.workers import BatchWorker
+from gyms.models import GymBranch
+from . import audit
+from .audit import log_activity, write_activity_logs
+from .blacklist import blacklist_filter
+from .idempotency import claim_key
+from .mailer import flush_mail, mailer, queue_mail, send_messages
+from .models import ActivityLog, ActivityLogDailyRollup, EmailVerificationCode, IdempotencyKey, User
+from .partitions import (
+    add_months,
+    archive_month,
+    ensure_period_table,
+    list_period_tables,
+    month_start,
+    period_table_name,
+    rollup_pending_days,
+)
+from .verification import hash_code, issue_code, redeem_code
+
+
+class AccountFixtureMixin:
+    """One branch with an admin, a trainer and a few members."""
+
+    member_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = GymBranch.objects.create(name='Downtown', location='Main street')
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='pass')
+        cls.trainer = User.objects.create_user(
+            email='trainer@example.com', password='pass', role='TRAINER', gym_branch=cls.branch
+        )
+        cls.members = [
+            User.objects.create_user(
+                email=f'member{i}@example.com', password='pass', role='MEMBER', gym_branch=cls.branch
+            )
+            for i in range(cls.member_count)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+
+class ActivityLogWriterTests(AccountFixtureMixin, TestCase):
+    """log_activity() routes by ACTIVITY_LOG_MODE; the batch worker flushes by size, time and at exit."""
+
+    def worker(self, **kwargs):
+        batches, delivered = [], threading.Event()
+
+        def collect(batch):
+            batches.append(batch)
+            delivered.set()
+
+        worker = BatchWorker(collect, **kwargs)
+        self.addCleanup(worker.stop)
+        return worker, batches, delivered
+
+    def entry(self, **overrides):
+        return {
+            'user_id': self.trainer.pk, 'action': 'LOGIN', 'model_name': 'User', 'object_id': self.trainer.pk,
+            'details': None, 'ip_address': None, 'created_at': timezone.now(), **overrides,
+        }
+
+    def test_flushes_when_batch_is_full(self):
+        worker, batches, delivered = self.worker(batch_size=3, flush_interval=0.5)
+        for item in range(3):
+            worker.put(item)
+
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual(batches, [[0, 1, 2]])
+
+    def test_flushes_when_interval_passes(self):
+        worker, batches, delivered = self.worker(batch_size=100, flush_interval=0.05)
+        worker.put('only')
+
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual(batches, [['only']])
+
+    def test_stop_flushes_what_is_left(self):
+        worker, batches, _ = self.worker(batch_size=100, flush_interval=0.2)
+        worker.put('a')
+        worker.put('b')
+        worker.stop()
+
+        self.assertEqual([item for batch in batches for item in batch], ['a', 'b'])
+        self.assertIsNone(worker._thread)
+
+    def test_sync_mode_writes_inline(self):
+        log_activity(self.trainer, 'LOGIN', 'User', self.trainer.pk)
+        self.assertEqual(ActivityLog.objects.filter(user=self.trainer, action='LOGIN').count(), 1)
+
+    @override_settings(ACTIVITY_LOG_MODE='buffered')
+    def test_buffered_mode_queues_for_the_writer(self):
+        with patch.object(audit, 'writer') as writer:
+            log_activity(self.trainer, 'LOGIN', 'User', self.trainer.pk)
+
+        writer.put.assert_called_once()
+        self.assertFalse(ActivityLog.objects.exists())
+
+        audit._flush([writer.put.call_args.args[0]])
+        self.assertEqual(ActivityLog.objects.filter(user=self.trainer, action='LOGIN').count(), 1)
+
+    @override_settings(ACTIVITY_LOG_MODE='celery')
+    def test_celery_mode_hands_batches_to_the_task(self):
+        entry = self.entry()
+        with patch('account.tasks.write_activity_log_batch.delay') as delay:
+            audit._flush([entry])
+
+        (encoded,), _ = delay.call_args
+        self.assertFalse(ActivityLog.objects.exists())
+        self.assertEqual([audit.decode_entry(item) for item in encoded], [entry])
+
+    def test_bad_row_falls_back_to_row_by_row(self):
+        entries = [self.entry(object_id=1), self.entry(action=None), self.entry(object_id=2)]
+        with self.assertLogs('account.audit', 'WARNING'):
+            write_activity_logs(entries)
+
+        self.assertEqual(
+            sorted(ActivityLog.objects.values_list('object_id', flat=True)), [1, 2]
+        )
+
+
+class ActivityRollupTests(AccountFixtureMixin, TestCase):
+    """Daily rollups never recompute a day whose raw rows may be archived."""
+
+    def test_archived_last_day_is_kept(self):
+        last = timezone.localdate() - timedelta(days=200)
+        ActivityLogDailyRollup.objects.create(day=last, user=self.trainer, action='LOGIN', model_name='User', count=5)
+
+        with override_settings(ACTIVITY_LOG_HOT_MONTHS=3):
+            self.assertEqual(rollup_pending_days(until=last + timedelta(days=2)), 2)
+        self.assertEqual(ActivityLogDailyRollup.objects.get(day=last).count, 5)
+
+    def test_recent_last_day_is_recomputed(self):
+        last = timezone.localdate() - timedelta(days=1)
+        ActivityLogDailyRollup.objects.create(day=last, user=self.trainer, action='LOGIN', model_name='User', count=5)
+
+        self.assertEqual(rollup_pending_days(until=last), 1)
+        self.assertFalse(ActivityLogDailyRollup.objects.filter(day=last).exists())
+
+
+class ActivityArchiveTests(AccountFixtureMixin, TestCase):
+    """Closed months move into per-month tables, which are dropped past retention."""
+
+    def log(self, created_at, **fields):
+        fields = {'user': self.trainer, 'action': 'LOGIN', 'model_name': 'User', **fields}
+        return ActivityLog.objects.create(created_at=created_at, **fields)
+
+    def archived(self, table, *columns):
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {", ".join(map(qn, columns))} FROM {qn(table)} ORDER BY {qn("id")}')
+            return cursor.fetchall()
+
+    def test_copies_columns_by_name(self):
+        # A period table from before a column was added, in another order
+        qn = connection.ops.quote_name
+        table = period_table_name(2020, 1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {qn(table)} ({qn("model_name")} varchar(100), {qn("action")} varchar(20), '
+                f'{qn("id")} integer, {qn("user_id")} integer, {qn("object_id")} integer, '
+                f'{qn("ip_address")} char(39), {qn("created_at")} timestamp)'
+            )
+        entry = self.log(month_start(2020, 1) + timedelta(days=3), object_id=7, details={'via': 'api'})
+
+        self.assertEqual(archive_month(2020, 1), 1)
+        [(pk, action, model_name, object_id, details)] = self.archived(
+            table, 'id', 'action', 'model_name', 'object_id', 'details'
+        )
+        self.assertEqual((pk, action, model_name, object_id), (entry.pk, 'LOGIN', 'User', 7))
+        self.assertEqual(json.loads(details) if isinstance(details, str) else details, {'via': 'api'})
+
+    def months_ago(self, months):
+        today = timezone.localdate()
+        return add_months(today.year, today.month, -months)
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command('archive_activity_logs', hot_months=3, retention_months=24, stdout=out, **options)
+        return out.getvalue()
+
+    def test_closed_month_is_moved_and_rolled_up(self):
+        old = self.months_ago(5)
+        day = month_start(*old) + timedelta(days=2, hours=10)
+        old_logs = [self.log(day), self.log(day), self.log(day, action='LOGOUT')]
+        recent = self.log(timezone.now() - timedelta(days=1))
+
+        output = self.archive(chunk_size=2)
+
+        self.assertIn(f'Archived 3 row(s) from {old[0]:04d}-{old[1]:02d}.', output)
+        self.assertEqual(list(ActivityLog.objects.values_list('id', flat=True)), [recent.pk])
+        self.assertEqual(
+            [pk for pk, in self.archived(period_table_name(*old), 'id')], [entry.pk for entry in old_logs]
+        )
+        rollups = ActivityLogDailyRollup.objects.filter(day=timezone.localdate(day))
+        self.assertEqual(dict(rollups.values_list('action', 'count')), {'LOGIN': 2, 'LOGOUT': 1})
+
+    def test_dry_run_changes_nothing(self):
+        old = self.months_ago(5)
+        self.log(month_start(*old) + timedelta(days=2))
+        expired = ensure_period_table(*self.months_ago(30))
+
+        output = self.archive(dry_run=True)
+
+        self.assertIn(f'Would archive {old[0]:04d}-{old[1]:02d}.', output)
+        self.assertIn(f'Would drop {expired}.', output)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        self.assertFalse(ActivityLogDailyRollup.objects.exists())
+        self.assertEqual([table for _, _, table in list_period_tables()], [expired])
+
+    def test_tables_past_retention_are_dropped(self):
+        expired = ensure_period_table(*self.months_ago(24))
+        kept = ensure_period_table(*self.months_ago(23))
+
+        self.assertIn(f'Dropped {expired}.', self.archive())
+        self.assertEqual([table for _, _, table in list_period_tables()], [kept])
+
+
+class TokenBlacklistTests(AccountFixtureMixin, TestCase):
+    """Refreshes consult the blacklist filter; expired tokens are purged in chunks."""
+
+    def setUp(self):
+        super().setUp()
+        blacklist_filter.reset()
+
+    def login(self, user):
+        response = APIClient().post('/auth/login/', {'email': user.email, 'password': 'pass'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['refresh']
+
+    def refresh(self, token):
+        return APIClient().post('/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def blacklist_lookups(self, token):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            query['sql'] for query in ctx.captured_queries
+            if 'token_blacklist_blacklistedtoken' in query['sql'] and '"jti"' in query['sql']
+        ]
+
+    def test_refresh_skips_blacklist_lookup(self):
+        token = self.login(self.trainer)
+        with patch('account.blacklist.cache_is_shared', return_value=True):
+            self.refresh(self.login(self.trainer))  # builds the filter
+            self.assertEqual(self.blacklist_lookups(token), [])
+
+    def test_process_local_cache_always_queries(self):
+        token = self.login(self.trainer)
+        self.refresh(self.login(self.trainer))
+        self.assertEqual(len(self.blacklist_lookups(token)), 1)
+
+    def test_token_blacklisted_by_another_process_is_rejected(self):
+        token = self.login(self.trainer)
+        self.refresh(self.login(self.trainer))
+        # This process's filter and cache as they were before another worker rotated the token
+        stale_bloom = copy.deepcopy(blacklist_filter.bloom)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        blacklist_filter.bloom = stale_bloom
+        cache.clear()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_rotated_token_is_rejected(self):
+        token = self.login(self.trainer)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+        # A fresh process (empty filter, no cache markers) rebuilds from the database
+        blacklist_filter.reset()
+        cache.clear()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_purge_expired_tokens(self):
+        now = timezone.now()
+        expired = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.trainer, jti=f'expired-{i}', token='x', expires_at=now - timedelta(days=1))
+            for i in range(5)
+        ])
+        BlacklistedToken.objects.create(token=expired[0])
+        live = OutstandingToken.objects.create(user=self.trainer, jti='live', token='x', expires_at=now + timedelta(days=1))
+        BlacklistedToken.objects.create(token=live)
+
+        out = StringIO()
+        call_command('purge_expired_tokens', '--chunk-size', '2', stdout=out)
+        self.assertIn('Deleted 5 expired token(s) and 1 blacklist row(s)', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertTrue(BlacklistedToken.objects.filter(token=live).exists())
+
+
+class VerificationCodePurgeTests(AccountFixtureMixin, TestCase):
+    """Expired and used verification codes are deleted in chunks; live ones stay."""
+
+    def test_purge(self):
+        now = timezone.now()
+
+        def code(expires_at, is_used=False):
+            return EmailVerificationCode(
+                user=self.members[0], purpose='signup', code_hash='x', expires_at=expires_at, is_used=is_used
+            )
+
+        EmailVerificationCode.objects.bulk_create(
+            [code(now - timedelta(minutes=i + 1)) for i in range(5)]
+            + [code(now + timedelta(minutes=5), is_used=True), code(now - timedelta(minutes=1), is_used=True)]
+        )
+        live = EmailVerificationCode.objects.create(
+            user=self.members[0], purpose='signup', code_hash='x', expires_at=now + timedelta(minutes=10)
+        )
+
+        out = StringIO()
+        call_command('purge_verification_codes', '--dry-run', stdout=out)
+        self.assertIn('Would delete 7 verification code(s)', out.getvalue())
+        self.assertEqual(EmailVerificationCode.objects.count(), 8)
+
+        out = StringIO()
+        call_command('purge_verification_codes', '--chunk-size', '2', stdout=out)
+        self.assertIn('Deleted 6 expired code(s).', out.getvalue())
+        self.assertIn('Deleted 1 used code(s).', out.getvalue())
+        self.assertEqual(list(EmailVerificationCode.objects.values_list('id', flat=True)), [live.id])
+
+
+class StandInEmailBackend(BaseEmailBackend):
+    """
+    Records connections and sends; the first `failures` sends drop the
+    connection and addresses in `refused` are rejected by the server.
+    """
+    opened = 0
+    sent = []
+    failures = 0
+    refused = set()
+
+    def open(self):
+        type(self).opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if type(self).failures:
+            type(self).failures -= 1
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        refused = {address: (550, b'No such user') for message in messages for address in message.to
+                   if address in type(self).refused}
+        if refused:
+            raise smtplib.SMTPRecipientsRefused(refused)
+        type(self).sent.extend(messages)
+        return len(messages)
+
+
+@override_settings(EMAIL_BACKEND='account.tests.StandInEmailBackend', EMAIL_RETRY_BACKOFF=0)
+class MailQueueTests(TestCase):
+    """Queued mail is sent over one connection per batch and retried on failure."""
+
+    def setUp(self):
+        StandInEmailBackend.opened = 0
+        StandInEmailBackend.sent = []
+        StandInEmailBackend.failures = 0
+        StandInEmailBackend.refused = set()
+
+    def messages(self, count):
+        return [{'subject': f'Message {i}', 'body': 'Hello', 'to': [f'user{i}@example.com']} for i in range(count)]
+
+    def test_batch_shares_one_connection(self):
+        # No background thread: the test drains the queue itself
+        with override_settings(EMAIL_DELIVERY_MODE='queued'), patch.object(mailer, '_ensure_started'):
+            for message in self.messages(3):
+                queue_mail(**message)
+            self.assertEqual(StandInEmailBackend.sent, [])
+            flush_mail()
+        self.assertEqual(len(StandInEmailBackend.sent), 3)
+        self.assertEqual(StandInEmailBackend.opened, 1)
+
+    def test_dropped_connection_is_retried(self):
+        StandInEmailBackend.failures = 1
+        with self.assertLogs('account.mailer', 'WARNING'):
+            self.assertEqual(send_messages(self.messages(3)), [])
+        self.assertEqual([m.subject for m in StandInEmailBackend.sent], ['Message 0', 'Message 1', 'Message 2'])
+        self.assertEqual(StandInEmailBackend.opened, 2)
+
+    def test_refused_recipient_does_not_hold_up_the_batch(self):
+        StandInEmailBackend.refused = {'user0@example.com'}
+        with self.assertLogs('account.mailer', 'ERROR') as logs:
+            rejected = send_messages(self.messages(3))
+        self.assertEqual([message['to'] for message in rejected], [['user0@example.com']])
+        self.assertEqual([m.subject for m in StandInEmailBackend.sent], ['Message 1', 'Message 2'])
+        self.assertEqual(StandInEmailBackend.opened, 1)
+        self.assertFalse(any('Giving up' in line for line in logs.output))
+
+    def test_gives_up_after_retries(self):
+        StandInEmailBackend.failures = 100
+        with override_settings(EMAIL_SEND_RETRIES=2), self.assertLogs('account.mailer', 'WARNING') as logs:
+            self.assertEqual(len(send_messages(self.messages(2))), 2)
+        self.assertEqual(StandInEmailBackend.opened, 3)
+        self.assertEqual(sum('Giving up' in line for line in logs.output), 2)
+
+
+class VerificationCodeIssueTests(AccountFixtureMixin, TestCase):
+    """Codes are stored hashed and mailed; responses do not reveal accounts."""
+
+    def request_code(self, client, **data):
+        return client.post('/auth/verification-codes/', data, format='json')
+
+    def test_password_reset_code_is_hashed_and_mailed(self):
+        member = self.members[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.request_code(APIClient(), purpose='password_reset', email=member.email)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [member.email])
+
+        code = re.search(r'\b(\d{6})\b', mail.outbox[0].body).group(1)
+        stored = EmailVerificationCode.objects.get(user=member, purpose='password_reset')
+        self.assertEqual(str(stored.token), str(response.data['token']))
+        self.assertNotIn(code, stored.code_hash)
+        self.assertEqual(stored.code_hash, hash_code(code, stored.token))
+
+    def test_unknown_email_looks_the_same(self):
+        response = self.request_code(APIClient(), purpose='password_reset', email='nobody@example.com')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(set(response.data), {'token', 'expires_in'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(EmailVerificationCode.objects.exists())
+
+    def test_new_code_retires_the_previous_one(self):
+        self.assertEqual(self.request_code(APIClient(), purpose='2fa').status_code, 401)
+
+        client = self.client_for(self.trainer)
+        first = self.request_code(client, purpose='2fa').data['token']
+        second = self.request_code(client, purpose='2fa').data['token']
+        live = EmailVerificationCode.objects.filter(user=self.trainer, expires_at__gt=timezone.now())
+        self.assertEqual([str(token) for token in live.values_list('token', flat=True)], [str(second)])
+        self.assertNotEqual(first, second)
+
+
+class VerificationCodeRedeemTests(AccountFixtureMixin, TestCase):
+    """Redemption consumes a code once, within its attempt budget."""
+
+    def issue(self, user, purpose):
+        with patch('account.verification.generate_code', return_value='123456'):
+            return issue_code(user, purpose)
+
+    def redeem(self, client, **data):
+        return client.post('/auth/verification-codes/redeem/', data, format='json')
+
+    def test_signup_code_verifies_once(self):
+        member = self.members[0]
+        code = self.issue(member, 'signup')
+        client = self.client_for(member)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.redeem(client, purpose='signup', token=str(code.token), code='123456')
+        self.assertEqual(response.status_code, 200, response.content)
+        table = EmailVerificationCode._meta.db_table
+        code_queries = [q['sql'] for q in ctx.captured_queries if table in q['sql']]
+        self.assertEqual(len(code_queries), 2)
+        self.assertTrue(all(sql.startswith('UPDATE') for sql in code_queries))
+        self.assertTrue(User.objects.get(pk=member.pk).is_verified)
+
+        response = self.redeem(client, purpose='signup', token=str(code.token), code='123456')
+        self.assertEqual(response.status_code, 400)
+
+    def test_wrong_guesses_exhaust_the_code(self):
+        member = self.members[1]
+        code = self.issue(member, 'password_reset')
+        data = {'purpose': 'password_reset', 'email': member.email, 'token': str(code.token),
+                'new_password': 'Str0nger-pass!'}
+        for _ in range(code.max_attempts):
+            self.assertEqual(self.redeem(APIClient(), **data, code='000000').status_code, 400)
+        self.assertEqual(self.redeem(APIClient(), **data, code='123456').status_code, 400)
+        code.refresh_from_db()
+        self.assertEqual((code.attempts, code.is_used), (code.max_attempts, False))
+
+    def test_password_reset(self):
+        member = self.members[2]
+        code = self.issue(member, 'password_reset')
+        response = self.redeem(APIClient(), purpose='password_reset', email=member.email, token=str(code.token),
+                               code='123456', new_password='Str0nger-pass!')
+        self.assertEqual(response.status_code, 200, response.content)
+        member.refresh_from_db()
+        self.assertTrue(member.check_password('Str0nger-pass!'))
+
+
+class VerificationCodeThrottleTests(AccountFixtureMixin, TestCase):
+    """Requesting and redeeming codes is rate limited per client and per target account."""
+
+    def limit(self, scope):
+        return ScopedRateThrottle().parse_rate(ScopedRateThrottle.THROTTLE_RATES[scope])[0]
+
+    def post(self, url, ip, **data):
+        return APIClient().post(url, data, format='json', REMOTE_ADDR=ip)
+
+    def test_codes_per_account(self):
+        email = self.members[0].email
+        for i in range(self.limit('verification_code_account')):
+            response = self.post('/auth/verification-codes/', f'10.0.0.{i}', purpose='password_reset', email=email)
+            self.assertEqual(response.status_code, 202)
+
+        response = self.post('/auth/verification-codes/', '10.0.1.1', purpose='password_reset', email=email.upper())
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(EmailVerificationCode.objects.filter(user=self.members[0]).count(),
+                         self.limit('verification_code_account'))
+
+    def test_codes_per_client(self):
+        for i in range(self.limit('verification_code')):
+            response = self.post('/auth/verification-codes/', '10.0.0.1', purpose='password_reset',
+                                 email=f'nobody{i}@example.com')
+            self.assertEqual(response.status_code, 202)
+
+        response = self.post('/auth/verification-codes/', '10.0.0.1', purpose='password_reset',
+                             email=self.members[1].email)
+        self.assertEqual(response.status_code, 429)
+
+    def test_redemptions_per_account(self):
+        member = self.members[2]
+        token = str(issue_code(member, 'password_reset').token)
+        data = {'purpose': 'password_reset', 'email': member.email, 'token': token, 'code': '000000',
+                'new_password': 'Str0nger-pass!'}
+        for i in range(self.limit('verification_redeem_account')):
+            self.assertEqual(self.post('/auth/verification-codes/redeem/', f'10.0.0.{i}', **data).status_code, 400)
+        self.assertEqual(self.post('/auth/verification-codes/redeem/', '10.0.1.1', **data).status_code, 429)
+
+
+class VerificationCodeConcurrencyTests(TransactionTestCase):
+    """Many threads redeeming one code at once: attempts never exceed the budget."""
+
+    threads = 16
+
+    def setUp(self):
+        branch = GymBranch.objects.create(name='Uptown', location='Hill road')
+        self.user = User.objects.create_user(email='racer@example.com', password='pass', role='MEMBER',
+                                             gym_branch=branch)
+        with patch('account.verification.generate_code', return_value='123456'):
+            self.code = issue_code(self.user, '2fa')
+
+    def hammer(self, guesses):
+        barrier = threading.Barrier(len(guesses))
+
+        def attempt(guess):
+            try:
+                barrier.wait()
+                for _ in range(50):
+                    try:
+                        return redeem_code(self.user.pk, '2fa', self.code.token, guess)
+                    except OperationalError:
+                        # SQLite allows one writer at a time; other databases queue on the row lock
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(guesses)) as pool:
+            return list(pool.map(attempt, guesses))
+
+    def test_attempt_budget_holds(self):
+        results = self.hammer(['000000'] * self.threads)
+        self.assertEqual(results, [False] * self.threads)
+        self.code.refresh_from_db()
+        self.assertEqual(self.code.attempts, self.code.max_attempts)
+
+    def test_code_is_consumed_once(self):
+        results = self.hammer(['123456'] * self.threads)
+        self.assertEqual(results.count(True), 1)
+        self.code.refresh_from_db()
+        self.assertTrue(self.code.is_used)
+        self.assertLessEqual(self.code.attempts, self.code.max_attempts)
+
+
+class UserCreateTests(AccountFixtureMixin, TestCase):
+    """User creation validates the email it will actually store."""
+
+    def test_case_variant_of_existing_email(self):
+        data = {'email': 'member0@EXAMPLE.com', 'password': 'Str0nger-pass!', 'role': 'MEMBER'}
+        response = self.client_for(self.trainer).post('/auth/users/', data, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('email', response.data)
+
+        data['email'] = 'new.member@EXAMPLE.com'
+        response = self.client_for(self.trainer).post('/auth/users/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(User.objects.filter(email='new.member@example.com').exists())
+
+
+class IdempotencyKeyTests(AccountFixtureMixin, TestCase):
+    """Creates sent with an Idempotency-Key run once; retries get the stored response."""
+
+    def post_user(self, data, key, user=None):
+        return self.client_for(user or self.trainer).post(
+            '/auth/users/', data, format='json', headers={'Idempotency-Key': key}
+        )
+
+    def user_data(self, **overrides):
+        data = {'email': 'new.member@example.com', 'password': 'Str0nger-pass!', 'role': 'MEMBER',
+                'first_name': 'New', 'last_name': 'Member'}
+        data.update(overrides)
+        return data
+
+    def test_retry_replays_without_creating_again(self):
+        first = self.post_user(self.user_data(), 'retry-1')
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+
+        count = User.objects.count()
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.post_user(self.user_data(), 'retry-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(User.objects.count(), count)
+        self.assertFalse([q for q in ctx.captured_queries if User._meta.db_table in q['sql']])
+
+        # Keys are per user and per key
+        self.assertEqual(self.post_user(self.user_data(email='other@example.com'), 'retry-2').status_code, 201)
+        self.assertEqual(User.objects.count(), count + 1)
+        response = self.post_user(
+            self.user_data(email='third@example.com', gym_branch=self.branch.pk), 'retry-1', user=self.admin
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+
+    def test_key_reused_for_another_request(self):
+        self.assertEqual(self.post_user(self.user_data(), 'reuse').status_code, 201)
+        response = self.post_user(self.user_data(first_name='Different'), 'reuse')
+        self.assertEqual(response.status_code, 422)
+
+    def test_duplicate_while_first_is_running(self):
+        IdempotencyKey.objects.create(
+            user=self.trainer, key='running', fingerprint='x' * 64,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        with patch('account.idempotency.request_fingerprint', return_value='x' * 64):
+            response = self.post_user(self.user_data(), 'running')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_abandoned_claim_is_taken_over(self):
+        claim, claimed = claim_key(self.trainer, 'abandoned', 'x' * 64)
+        self.assertTrue(claimed)
+        self.assertLessEqual(claim.expires_at, timezone.now() + timedelta(seconds=60))
+
+        # The claiming worker died; the lease runs out long before the TTL
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.post_user(self.user_data(), 'abandoned')
+        self.assertEqual(response.status_code, 201, response.content)
+        record = IdempotencyKey.objects.get(key='abandoned')
+        self.assertEqual(record.status_code, 201)
+        self.assertGreater(record.expires_at, timezone.now() + timedelta(hours=23))
+
+    def test_failed_request_releases_key(self):
+        response = self.post_user(self.user_data(role='TRAINER'), 'fix-and-retry')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.filter(key='fix-and-retry').exists())
+        self.assertEqual(self.post_user(self.user_data(), 'fix-and-retry').status_code, 201)
+
+    def test_expired_keys_are_taken_over_and_purged(self):
+        self.post_user(self.user_data(), 'old')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        retry = self.post_user(self.user_data(email='other@example.com'), 'old')
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry.headers)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', '--chunk-size=1', stdout=out)
+        self.assertIn('Deleted 1 idempotency key(s)', out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
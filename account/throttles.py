@@ -0,0 +1,24 @@
+import hashlib
+
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class AccountScopedRateThrottle(ScopedRateThrottle):
+    """
+    ScopedRateThrottle keyed by the account a request is about rather than
+    by the caller: the `email` of a password reset, else the signed-in user.
+    The rate is the one named by the view's `throttle_account_scope`, so a
+    view can pair it with a per-IP ScopedRateThrottle. Anonymous requests
+    that name no email are left to the view (which rejects them).
+    """
+    scope_attr = 'throttle_account_scope'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if request.data.get('purpose') == 'password_reset' else None
+        if email:
+            ident = hashlib.sha256(str(email).strip().lower().encode()).hexdigest()
+        elif request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
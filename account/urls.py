@@ -6,7 +6,11 @@ from .views import (
     UserViewSet,
     UserProfileView,
     PasswordChangeView,
-    ActivityLogListView
+    ActivityLogListView,
+    ActivityLogExportView,
+    ActivityLogSummaryView,
+    VerificationCodeRequestView,
+    VerificationCodeRedeemView
 )
 
 app_name = 'account'
@@ -20,6 +24,8 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('change-password/', PasswordChangeView.as_view(), name='change_password'),
+    path('verification-codes/', VerificationCodeRequestView.as_view(), name='verification_codes'),
+    path('verification-codes/redeem/', VerificationCodeRedeemView.as_view(), name='verification_codes_redeem'),
 
     # Profile
     path('profile/', UserProfileView.as_view(), name='profile'),
@@ -29,4 +35,6 @@ urlpatterns = [
 
     # Logs
     path('activity-logs/', ActivityLogListView.as_view(), name='activity_logs'),
+    path('activity-logs/export/', ActivityLogExportView.as_view(), name='activity_logs_export'),
+    path('activity-logs/summary/', ActivityLogSummaryView.as_view(), name='activity_logs_summary'),
 ]
\ No newline at end of file
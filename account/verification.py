@@ -0,0 +1,85 @@
+"""
+Email verification codes (signup, password reset, two-factor).
+
+Only an HMAC of each code is stored, keyed with SECRET_KEY and bound to the
+code's token, so a leaked table reveals no usable codes. Issuing a code
+retires the user's earlier unused codes for the same purpose and queues
+the mail once the row is committed (see account.mailer).
+
+Redemption never reads the row into Python: spending an attempt and
+consuming the code are each one conditional UPDATE on the
+(user, purpose, is_used, token) index, so concurrent guesses cannot exceed
+max_attempts and a code is consumed at most once.
+"""
+import hashlib
+import hmac
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .mailer import queue_mail
+from .models import EmailVerificationCode
+
+MAIL_SUBJECTS = {
+    'signup': 'Confirm your email address',
+    'password_reset': 'Your password reset code',
+    '2fa': 'Your sign-in code',
+}
+
+
+def generate_code():
+    return f'{secrets.randbelow(10 ** settings.VERIFICATION_CODE_LENGTH):0{settings.VERIFICATION_CODE_LENGTH}d}'
+
+
+def hash_code(code, token):
+    message = f'{token}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def issue_code(user, purpose):
+    """Create a code for `user` and queue it by mail. Returns the stored row."""
+    now = timezone.now()
+    code = generate_code()
+
+    with transaction.atomic():
+        # Only the newest code of a purpose is redeemable
+        EmailVerificationCode.objects.filter(
+            user=user, purpose=purpose, is_used=False, expires_at__gt=now
+        ).update(expires_at=now, updated_at=now)
+
+        verification = EmailVerificationCode(
+            user=user,
+            purpose=purpose,
+            expires_at=now + timedelta(seconds=settings.VERIFICATION_CODE_TTL),
+            max_attempts=settings.VERIFICATION_CODE_MAX_ATTEMPTS,
+        )
+        verification.code_hash = hash_code(code, verification.token)
+        verification.save()
+
+        minutes = settings.VERIFICATION_CODE_TTL // 60
+        transaction.on_commit(lambda: queue_mail(
+            MAIL_SUBJECTS[purpose],
+            f'Your code is {code}. It expires in {minutes} minute(s).\n\n'
+            f'If you did not ask for it, you can ignore this email.',
+            [user.email],
+        ))
+    return verification
+
+
+def redeem_code(user_id, purpose, token, code):
+    """Consume the code if it is live, has attempts left and matches. Returns True on success."""
+    now = timezone.now()
+    live = EmailVerificationCode.objects.filter(
+        user_id=user_id, purpose=purpose, is_used=False, token=token, expires_at__gt=now
+    )
+
+    # Every guess spends an attempt, right or wrong, while any are left
+    spent = live.filter(attempts__lt=F('max_attempts')).update(attempts=F('attempts') + 1, updated_at=now)
+    if not spent:
+        return False
+
+    return bool(live.filter(code_hash=hash_code(code, token)).update(is_used=True, used_at=now, updated_at=now))
@@ -1,27 +1,49 @@
 from rest_framework import viewsets, status, generics
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.throttling import ScopedRateThrottle
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import serializers
-
-from .models import User, ActivityLog
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from datetime import timedelta
+import uuid
+
+from .audit import log_activity
+from .authentication import ClaimsJWTAuthentication, add_claims, set_auth_state
+from .idempotency import IdempotentCreateMixin
+from .models import User, ActivityLog, ActivityLogDailyRollup
 from .serializers import (
     UserCreateSerializer,
     UserListSerializer,
     UserUpdateSerializer,
     CustomTokenObtainPairSerializer,
-    PasswordChangeSerializer
+    PasswordChangeSerializer,
+    VerificationCodeRequestSerializer,
+    VerificationCodeRedeemSerializer
 )
 from .permissions import CanManageUsers
+from .throttles import AccountScopedRateThrottle
+from .verification import issue_code, redeem_code
+from CORE.cache import bump_models
+from CORE.exports import StreamingExportMixin
+from CORE.fieldsets import SparseFieldsetMixin
+from CORE.pagination import KeysetOrOffsetPagination
+from CORE.values import ValuesListMixin
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(IdempotentCreateMixin, SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows Users to be viewed or edited.
     """
     permission_classes = [IsAuthenticated, CanManageUsers]
+    authentication_classes = [ClaimsJWTAuthentication]
+    pagination_class = KeysetOrOffsetPagination
     queryset = User.objects.all()
+    sparse_object_fields = ('gym_branch', 'role')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -39,21 +61,24 @@ class UserViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return User.objects.none()
 
+        # Serializer reads gym_branch.name, join it up front
+        queryset = User.objects.select_related('gym_branch')
+
         if user.role == 'ADMIN':
-            return User.objects.all()
+            return queryset
 
         if user.role == 'MANAGER':
-            return User.objects.filter(gym_branch=user.gym_branch)
+            return queryset.filter(gym_branch_id=user.gym_branch_id)
 
         if user.role == 'TRAINER':
-            return User.objects.filter(gym_branch=user.gym_branch, role='MEMBER')
+            return queryset.filter(gym_branch_id=user.gym_branch_id, role='MEMBER')
 
         return User.objects.none()
 
     def perform_create(self, serializer):
         user_instance = serializer.save()
 
-        ActivityLog.objects.create(
+        log_activity(
             user=self.request.user,
             action='CREATE',
             model_name='User',
@@ -66,7 +91,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         user_instance = serializer.save()
 
-        ActivityLog.objects.create(
+        log_activity(
             user=self.request.user,
             action='UPDATE',
             model_name='User',
@@ -86,10 +111,11 @@ class LoginView(TokenObtainPairView):
             return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
 
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = add_claims(RefreshToken.for_user(user), user)
+        set_auth_state(user)
 
         # Log Login
-        ActivityLog.objects.create(
+        log_activity(
             user=user,
             action='LOGIN',
             model_name='User',
@@ -100,7 +126,7 @@ class LoginView(TokenObtainPairView):
             'refresh': str(refresh),
             'access': str(refresh.access_token),
             'role': user.role,
-            'gym_branch': user.gym_branch.id if user.gym_branch else None,
+            'gym_branch': user.gym_branch_id,
             'email': user.email
         }, status=status.HTTP_200_OK)
 
@@ -133,6 +159,80 @@ class PasswordChangeView(generics.GenericAPIView):
         return Response({"status": "Password updated successfully"}, status=status.HTTP_200_OK)
 
 
+class VerificationCodeRequestView(generics.GenericAPIView):
+    """
+    Email a verification code. Signup and 2FA codes go to the signed-in
+    user; password reset codes to the given address. The response carries the
+    token to redeem the code with, and looks the same whether or not the
+    address belongs to an account.
+    """
+    serializer_class = VerificationCodeRequestSerializer
+    permission_classes = [AllowAny]
+    # Per client and per target account: each code mails someone and buys
+    # another VERIFICATION_CODE_MAX_ATTEMPTS guesses
+    throttle_classes = [ScopedRateThrottle, AccountScopedRateThrottle]
+    throttle_scope = 'verification_code'
+    throttle_account_scope = 'verification_code_account'
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        purpose = serializer.validated_data['purpose']
+
+        if purpose == 'password_reset':
+            email = User.objects.normalize_email(serializer.validated_data['email'])
+            user = User.objects.filter(email=email, is_active=True).first()
+        elif request.user.is_authenticated:
+            user = request.user
+        else:
+            raise NotAuthenticated()
+
+        token = issue_code(user, purpose).token if user is not None else uuid.uuid4()
+        return Response(
+            {'token': token, 'expires_in': settings.VERIFICATION_CODE_TTL},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class VerificationCodeRedeemView(generics.GenericAPIView):
+    """
+    Redeem a code from VerificationCodeRequestView. A signup code marks the
+    user verified and a password reset code sets `new_password`; a 2FA code
+    is only confirmed. Wrong, expired, used or exhausted codes all get the
+    same 400.
+    """
+    serializer_class = VerificationCodeRedeemSerializer
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle, AccountScopedRateThrottle]
+    throttle_scope = 'verification_redeem'
+    throttle_account_scope = 'verification_redeem_account'
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        purpose = data['purpose']
+
+        if purpose == 'password_reset':
+            email = User.objects.normalize_email(data['email'])
+            user = User.objects.filter(email=email, is_active=True).first()
+        elif request.user.is_authenticated:
+            user = request.user
+        else:
+            raise NotAuthenticated()
+
+        if user is None or not redeem_code(user.pk, purpose, data['token'], data['code']):
+            return Response({'code': ['Invalid or expired code.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        if purpose == 'signup':
+            User.objects.filter(pk=user.pk).update(is_verified=True, updated_at=timezone.now())
+            bump_models(User)
+        elif purpose == 'password_reset':
+            user.set_password(data['new_password'])
+            user.save(update_fields=['password', 'updated_at'])
+        return Response({'status': 'Code accepted'}, status=status.HTTP_200_OK)
+
+
 class ActivityLogListView(generics.ListAPIView):
     """
     Optional: Admin only activity logs
@@ -148,8 +248,70 @@ class ActivityLogListView(generics.ListAPIView):
 
     serializer_class = LogSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = [ClaimsJWTAuthentication]
+    pagination_class = KeysetOrOffsetPagination
 
     def get_queryset(self):
         if self.request.user.role == 'ADMIN':
             return ActivityLog.objects.all()
-        return ActivityLog.objects.filter(user=self.request.user)
\ No newline at end of file
+        return ActivityLog.objects.filter(user_id=self.request.user.id)
+
+
+class ActivityLogExportView(StreamingExportMixin, ActivityLogListView):
+    """
+    Stream activity logs as CSV or NDJSON (?output=csv|ndjson).
+    Same scoping as the list: Admin gets everything, others their own logs.
+    """
+    export_filename = 'activity_logs'
+    export_columns = (
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('user', 'user_id'),
+        ('user_email', 'user__email'),
+        ('action', 'action'),
+        ('model_name', 'model_name'),
+        ('object_id', 'object_id'),
+        ('details', 'details'),
+        ('ip_address', 'ip_address'),
+    )
+
+    def get(self, request, *args, **kwargs):
+        return self.export_response(self.get_queryset())
+
+
+class ActivityLogSummaryView(generics.GenericAPIView):
+    """
+    Activity counts over a date range, read from the daily rollups.
+    Admin sees everyone (optionally filtered by ?user=), others see themselves.
+    Covers finished days only; today's activity appears after the nightly rollup.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    class QuerySerializer(serializers.Serializer):
+        start = serializers.DateField(required=False)
+        end = serializers.DateField(required=False)
+        user = serializers.IntegerField(required=False)
+
+    def get(self, request):
+        params = self.QuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        end = params.validated_data.get('end') or timezone.localdate() - timedelta(days=1)
+        start = params.validated_data.get('start') or end - timedelta(days=29)
+
+        rollups = ActivityLogDailyRollup.objects.filter(day__range=(start, end)).order_by()
+        if request.user.role == 'ADMIN':
+            if 'user' in params.validated_data:
+                rollups = rollups.filter(user_id=params.validated_data['user'])
+        else:
+            rollups = rollups.filter(user_id=request.user.id)
+
+        totals = rollups.values('action', 'model_name').annotate(count=Sum('count')).order_by('action', 'model_name')
+        by_day = rollups.values('day').annotate(count=Sum('count')).order_by('day')
+
+        return Response({
+            'start': start,
+            'end': end,
+            'totals': list(totals),
+            'by_day': list(by_day),
+        })
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gyms.models import GymBranchStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the per-branch trainer and member counters from the users table. '
+        'Run after bulk user changes made with QuerySet.update() or raw SQL.'
+    )
+
+    def handle(self, *args, **options):
+        branches = GymBranchStats.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters for {branches} branch(es).'))
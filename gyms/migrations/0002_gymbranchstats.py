@@ -0,0 +1,47 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_branch_stats(apps, schema_editor):
+    GymBranch = apps.get_model('gyms', 'GymBranch')
+    GymBranchStats = apps.get_model('gyms', 'GymBranchStats')
+    User = apps.get_model('account', 'User')
+
+    fields = {'TRAINER': 'trainer_count', 'MEMBER': 'member_count'}
+    counts = {}
+    users = User.objects.filter(is_active=True, role__in=fields, gym_branch__isnull=False)
+    for row in users.order_by().values('gym_branch_id', 'role').annotate(total=Count('id')):
+        counts.setdefault(row['gym_branch_id'], {})[fields[row['role']]] = row['total']
+
+    GymBranchStats.objects.bulk_create([
+        GymBranchStats(branch_id=branch_id, **counts.get(branch_id, {}))
+        for branch_id in GymBranch.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gyms', '0001_initial'),
+        ('account', '0006_activitylogdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GymBranchStats',
+            fields=[
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='gyms.gymbranch')),
+                ('trainer_count', models.PositiveIntegerField(default=0)),
+                ('member_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Gym Branch Stats',
+                'db_table': 'gym_branch_stats',
+            },
+        ),
+        migrations.RunPython(backfill_branch_stats, migrations.RunPython.noop),
+    ]
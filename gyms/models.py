@@ -1,5 +1,11 @@
 from django.db import models
+from django.db.models import Count, F
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from CORE.cache import bump_models
+
+MAX_TRAINERS_PER_BRANCH = 3
 
 
 class GymBranch(models.Model):
@@ -29,20 +35,141 @@ class GymBranch(models.Model):
 
         # Check trainer limit only when updating
         if self.pk:
-            trainer_count = self.users.filter(role='TRAINER', is_active=True).count()
-            if trainer_count > 3:
+            if self.trainer_count > MAX_TRAINERS_PER_BRANCH:
                 raise ValidationError({
-                    'trainers': 'A gym branch can have a maximum of 3 trainers'
+                    'trainers': f'A gym branch can have a maximum of {MAX_TRAINERS_PER_BRANCH} trainers'
                 })
 
+    def get_stats(self, refresh=False):
+        """
+        The branch's counters. The stats row is created with the branch (see
+        gyms.signals); a branch without one (e.g. from bulk_create, until
+        `reconcile_branch_stats` runs) reads as zero rather than writing here.
+        """
+        try:
+            if refresh and 'stats' in self._state.fields_cache:
+                self.stats.refresh_from_db()
+            return self.stats
+        except GymBranchStats.DoesNotExist:
+            return GymBranchStats(branch_id=self.pk)
+
     @property
     def trainer_count(self):
-        return self.users.filter(role='TRAINER', is_active=True).count()
+        return self.get_stats().trainer_count
 
     @property
     def member_count(self):
-        return self.users.filter(role='MEMBER', is_active=True).count()
+        return self.get_stats().member_count
 
     @property
     def can_add_trainer(self):
-        return self.trainer_count < 3
\ No newline at end of file
+        return self.trainer_count < MAX_TRAINERS_PER_BRANCH
+
+
+class GymBranchStats(models.Model):
+    """
+    Denormalized count of active trainers and members per branch.
+    Kept in step by User.save() / User deletion, in the same transaction as
+    the user change; `reconcile_branch_stats` rebuilds it from scratch.
+    The trainer counter is also the trainer-limit check (see adjust()).
+    """
+
+    COUNTED_ROLES = {
+        'TRAINER': 'trainer_count',
+        'MEMBER': 'member_count',
+    }
+
+    branch = models.OneToOneField(
+        GymBranch,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    trainer_count = models.PositiveIntegerField(default=0)
+    member_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'gym_branch_stats'
+        verbose_name_plural = 'Gym Branch Stats'
+
+    def __str__(self):
+        return f"{self.branch_id}: {self.trainer_count} trainers, {self.member_count} members"
+
+    # Counters that must never exceed a limit
+    LIMITS = {
+        'trainer_count': MAX_TRAINERS_PER_BRANCH,
+    }
+
+    @classmethod
+    def adjust(cls, branch_id, role, delta):
+        """
+        Add `delta` to the counter for `role` in one conditional UPDATE.
+
+        The WHERE clause carries the bounds (the limit for increments, zero
+        for decrements), so concurrent writers are serialized by the row
+        lock and re-checked against the committed value. Returns False,
+        changing nothing, when the counter is out of room.
+        """
+        field = cls.COUNTED_ROLES[role]
+        rows = cls.objects.filter(branch_id=branch_id)
+        limit = cls.LIMITS.get(field)
+        if delta > 0 and limit is not None:
+            rows = rows.filter(**{f'{field}__lte': limit - delta})
+        elif delta < 0:
+            rows = rows.filter(**{f'{field}__gte': -delta})
+
+        if rows.update(**{field: F(field) + delta}, updated_at=timezone.now()):
+            bump_models(cls)
+            return True
+        if cls.objects.filter(branch_id=branch_id).exists():
+            return False
+        # No stats row yet: build it from users, which do not reflect the change yet
+        cls.recount(branch_id)
+        return cls.adjust(branch_id, role, delta)
+
+    @classmethod
+    def grouped_counts(cls, branch_ids=None):
+        """{branch_id: {field: count}} from a single grouped query over users."""
+        from account.models import User
+
+        users = User.objects.filter(is_active=True, role__in=cls.COUNTED_ROLES, gym_branch__isnull=False)
+        if branch_ids is not None:
+            users = users.filter(gym_branch_id__in=branch_ids)
+
+        counts = {}
+        for row in users.order_by().values('gym_branch_id', 'role').annotate(total=Count('id')):
+            counts.setdefault(row['gym_branch_id'], {})[cls.COUNTED_ROLES[row['role']]] = row['total']
+        return counts
+
+    @classmethod
+    def recount(cls, branch_id):
+        counts = cls.grouped_counts([branch_id]).get(branch_id, {})
+        stats, _ = cls.objects.update_or_create(
+            branch_id=branch_id,
+            defaults={'trainer_count': counts.get('trainer_count', 0), 'member_count': counts.get('member_count', 0)},
+        )
+        return stats
+
+    @classmethod
+    def reconcile(cls):
+        """Recompute every branch's counters. Returns the number of branches written."""
+        counts = cls.grouped_counts()
+        now = timezone.now()
+        rows = [
+            cls(
+                branch_id=branch_id,
+                trainer_count=counts.get(branch_id, {}).get('trainer_count', 0),
+                member_count=counts.get(branch_id, {}).get('member_count', 0),
+                updated_at=now,
+            )
+            for branch_id in GymBranch.objects.values_list('id', flat=True)
+        ]
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['branch'],
+            update_fields=['trainer_count', 'member_count', 'updated_at'],
+        )
+        bump_models(cls)
+        return len(rows)
\ No newline at end of file
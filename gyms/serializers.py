@@ -4,7 +4,10 @@ from .models import GymBranch
 
 class GymBranchSerializer(serializers.ModelSerializer):
     """Serializer for GymBranch model"""
-    
+    trainer_count = serializers.IntegerField(read_only=True)
+    member_count = serializers.IntegerField(read_only=True)
+    can_add_trainer = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = GymBranch
         fields = '__all__'
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from CORE.cache import track_model_changes
+from .models import GymBranch, GymBranchStats
+
+track_model_changes(GymBranch, GymBranchStats)
+
+
+@receiver(post_save, sender=GymBranch)
+def create_branch_stats(sender, instance, created, **kwargs):
+    # Branches that predate the stats table were backfilled by its migration
+    if created:
+        GymBranchStats.objects.get_or_create(branch=instance)
@@ -1,3 +1,117 @@
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from account.models import User
+from .models import GymBranch, GymBranchStats
+
+
+class BranchCounterTests(TestCase):
+    """GymBranchStats follows every user create, change and delete."""
+
+    def setUp(self):
+        self.branch = GymBranch.objects.create(name='Downtown', location='Main street')
+        self.other_branch = GymBranch.objects.create(name='Uptown', location='Hill road')
+
+    def make_user(self, role, branch=None, **extra):
+        self.user_seq = getattr(self, 'user_seq', 0) + 1
+        return User.objects.create_user(
+            email=f'{role.lower()}{self.user_seq}@example.com', password='pass', role=role,
+            gym_branch=branch or self.branch, **extra
+        )
+
+    def counts(self, branch):
+        stats = GymBranchStats.objects.get(branch=branch)
+        return stats.trainer_count, stats.member_count
+
+    def test_create_and_delete(self):
+        trainer = self.make_user('TRAINER')
+        member = self.make_user('MEMBER')
+        self.make_user('MANAGER')
+        self.assertEqual(self.counts(self.branch), (1, 1))
+
+        trainer.delete()
+        User.objects.filter(pk=member.pk).delete()
+        self.assertEqual(self.counts(self.branch), (0, 0))
+
+    def test_role_branch_and_active_changes(self):
+        user = self.make_user('MEMBER')
+        user.role = 'TRAINER'
+        user.save()
+        self.assertEqual(self.counts(self.branch), (1, 0))
+
+        user.gym_branch = self.other_branch
+        user.save()
+        self.assertEqual(self.counts(self.branch), (0, 0))
+        self.assertEqual(self.counts(self.other_branch), (1, 0))
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.counts(self.other_branch), (0, 0))
+
+    def test_deferred_fields(self):
+        user = self.make_user('MEMBER')
+        deferred = User.objects.only('id', 'email').get(pk=user.pk)
+        deferred.role = 'TRAINER'
+        deferred.save()
+        self.assertEqual(self.counts(self.branch), (1, 0))
+
+    def test_trainer_limit_is_one_conditional_update(self):
+        trainers = [self.make_user('TRAINER') for _ in range(3)]
+        self.assertFalse(GymBranch.objects.get(pk=self.branch.pk).can_add_trainer)
+
+        # The limit check is the counter UPDATE itself, no COUNT over users
+        with CaptureQueriesContext(connection) as ctx, self.assertRaises(ValidationError):
+            self.make_user('TRAINER')
+        statements = [query['sql'] for query in ctx.captured_queries if 'gym_branch_stats' in query['sql']]
+        self.assertTrue(statements[0].startswith('UPDATE'), statements[0])
+        self.assertFalse([query['sql'] for query in ctx.captured_queries if 'COUNT(' in query['sql']])
+        self.assertEqual(User.objects.filter(role='TRAINER').count(), 3)
+        self.assertEqual(self.counts(self.branch), (3, 0))
+
+        # Promotions are held to the same limit; saving an existing trainer is not
+        member = self.make_user('MEMBER')
+        member.role = 'TRAINER'
+        with self.assertRaises(ValidationError):
+            member.save()
+        trainers[0].first_name = 'Renamed'
+        trainers[0].save()
+
+        # Freed slots can be reused
+        trainers[0].delete()
+        self.make_user('TRAINER')
+        self.assertEqual(self.counts(self.branch), (3, 1))
+
+    def test_trainer_limit_through_api(self):
+        manager = self.make_user('MANAGER')
+        for _ in range(3):
+            self.make_user('TRAINER')
+        client = APIClient()
+        client.force_authenticate(user=manager)
+        response = client.post('/auth/users/', {
+            'email': 'extra@example.com', 'password': 'Str0ng-pass!', 'role': 'TRAINER',
+            'gym_branch': self.branch.pk,
+        })
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(User.objects.filter(email='extra@example.com').exists())
+
+    def test_stats_row_comes_with_the_branch(self):
+        self.assertEqual(self.counts(self.branch), (0, 0))
+
+        # A branch without one reads as zero and is not written to on read
+        GymBranchStats.objects.filter(branch=self.other_branch).delete()
+        branch = GymBranch.objects.get(pk=self.other_branch.pk)
+        self.assertEqual((branch.trainer_count, branch.member_count, branch.can_add_trainer), (0, 0, True))
+        self.assertFalse(GymBranchStats.objects.filter(branch=self.other_branch).exists())
+
+    def test_reconcile(self):
+        self.make_user('TRAINER')
+        self.make_user('MEMBER')
+        User.objects.filter(role='MEMBER').update(is_active=False)  # bypasses the counters
+        GymBranchStats.objects.filter(branch=self.branch).update(trainer_count=7)
+
+        GymBranchStats.reconcile()
+        self.assertEqual(self.counts(self.branch), (1, 0))
+        self.assertEqual(self.counts(self.other_branch), (0, 0))
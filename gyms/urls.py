@@ -9,4 +9,5 @@ urlpatterns = [
     path('branches/<int:id>/', views.GymBranchDetailView.as_view(), name='gym-branches-detail'),
     path('branches/<int:id>/update/', views.GymBranchUpdateView.as_view(), name='gym-branches-update'),
     path('branches/<int:id>/delete/', views.GymBranchDeleteView.as_view(), name='gym-branches-delete'),
+    path('branches/<int:id>/analytics/', views.GymBranchAnalyticsView.as_view(), name='gym-branches-analytics'),
 ]
\ No newline at end of file
@@ -1,20 +1,40 @@
-from rest_framework import generics, status
+from rest_framework import generics, serializers, status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import GymBranch
+from .models import GymBranch, GymBranchStats
 from .serializers import GymBranchSerializer, GymBranchCreateUpdateSerializer
-from account.permissions import IsAdmin
+from account.authentication import ClaimsJWTAuthentication
+from account.models import User
+from account.permissions import IsAdmin, IsManager
+from CORE.cache import CachedResponseMixin
+from CORE.conditional import ConditionalGetMixin
+from CORE.fieldsets import SparseFieldsetMixin
+from workouts.analytics import get_branch_analytics
 
+# Counter properties read the stats row
+BRANCH_FIELD_SOURCES = {
+    'trainer_count': ('stats__trainer_count',),
+    'member_count': ('stats__member_count',),
+    'can_add_trainer': ('stats__trainer_count',),
+}
 
-class GymBranchListView(generics.ListAPIView):
+
+class GymBranchListView(CachedResponseMixin, SparseFieldsetMixin, ConditionalGetMixin, generics.ListAPIView):
     """List all gym branches with pagination - Admin only"""
     queryset = GymBranch.objects.all()
     serializer_class = GymBranchSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    authentication_classes = [ClaimsJWTAuthentication]
+    conditional_related = ('stats',)
+    # Counters change with users, and with reconcile_branch_stats / recount()
+    cache_models = (GymBranch, GymBranchStats, User)
+    field_sources = BRANCH_FIELD_SOURCES
 
     def get_queryset(self):
         """Optionally filter by active status"""
-        queryset = GymBranch.objects.all()
+        # Counters come from the one-to-one stats row
+        queryset = GymBranch.objects.select_related('stats')
 
         # Filter by active status if provided
         is_active = self.request.query_params.get('is_active', None)
@@ -31,11 +51,16 @@ class GymBranchCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, IsAdmin]
 
 
-class GymBranchDetailView(generics.RetrieveAPIView):
+class GymBranchDetailView(CachedResponseMixin, SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     """Retrieve a specific gym branch - Admin only"""
-    queryset = GymBranch.objects.all()
+    queryset = GymBranch.objects.select_related('stats')
     serializer_class = GymBranchSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    authentication_classes = [ClaimsJWTAuthentication]
+    conditional_related = ('stats',)
+    # Counters change with users, and with reconcile_branch_stats / recount()
+    cache_models = (GymBranch, GymBranchStats, User)
+    field_sources = BRANCH_FIELD_SOURCES
     lookup_field = 'id'
 
 
@@ -59,4 +84,28 @@ class GymBranchDeleteView(generics.DestroyAPIView):
         return Response(
             {"detail": "Gym branch deleted successfully"}, 
             status=status.HTTP_204_NO_CONTENT
-        )
\ No newline at end of file
+        )
+
+
+class GymBranchAnalyticsView(generics.GenericAPIView):
+    """
+    Training analytics for a branch - Admin (any branch), Manager (own branch).
+    Completion rate, overdue count and average days to complete, overall and
+    by trainer, plan and week (the last ?weeks= weeks, 12 by default).
+    """
+    queryset = GymBranch.objects.all()
+    permission_classes = [IsAuthenticated, IsAdmin | IsManager]
+    authentication_classes = [ClaimsJWTAuthentication]
+    lookup_field = 'id'
+
+    class QuerySerializer(serializers.Serializer):
+        weeks = serializers.IntegerField(required=False, min_value=1, max_value=52, default=12)
+
+    def get(self, request, id):
+        if request.user.role == 'MANAGER' and request.user.gym_branch_id != id:
+            raise PermissionDenied("You can only view analytics for your own branch.")
+        params = self.QuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        branch = self.get_object()
+        return Response(get_branch_analytics(branch.pk, params.validated_data['weeks']))
@@ -0,0 +1,61 @@
+"""
+Member agenda: today's tasks, the rest of this week and anything overdue.
+
+The payload is built with one query and cached per member and per day under
+a versioned namespace (see CORE.cache). Any save or delete of one of the
+member's tasks, or of a plan they have tasks in, bumps the member's version;
+the next request rebuilds it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from CORE.cache import bump_on_commit, versioned_key
+from .models import WorkoutTask
+
+AGENDA_NAMESPACE = 'member-agenda:{}'
+
+AGENDA_FIELDS = ('id', 'workout_plan', 'status', 'due_date', 'notes', 'completed_at')
+
+
+def invalidate_member_agenda(*member_ids):
+    bump_on_commit(*(AGENDA_NAMESPACE.format(member_id) for member_id in set(member_ids) if member_id))
+
+
+def invalidate_plan_agendas(plan_id):
+    member_ids = WorkoutTask.objects.filter(workout_plan_id=plan_id).order_by().values_list('member_id', flat=True)
+    invalidate_member_agenda(*member_ids.distinct())
+
+
+def get_member_agenda(member_id):
+    today = timezone.localdate()
+    key = versioned_key(AGENDA_NAMESPACE.format(member_id), today.isoformat())
+    agenda = cache.get(key)
+    if agenda is None:
+        agenda = build_member_agenda(member_id, today)
+        cache.set(key, agenda, settings.AGENDA_CACHE_TTL)
+    return agenda
+
+
+def build_member_agenda(member_id, today):
+    week_end = today + timedelta(days=6 - today.weekday())
+    tasks = (
+        WorkoutTask.objects
+        .filter(member_id=member_id)
+        .filter(Q(due_date__range=(today, week_end)) | Q(due_date__lt=today) & ~Q(status='COMPLETED'))
+        .order_by('due_date', 'id')
+        .values(*AGENDA_FIELDS, workout_plan_title=F('workout_plan__title'))
+    )
+
+    agenda = {'date': today, 'week_end': week_end, 'overdue': [], 'today': [], 'this_week': []}
+    for task in tasks:
+        if task['due_date'] < today:
+            agenda['overdue'].append(task)
+        elif task['due_date'] == today:
+            agenda['today'].append(task)
+        else:
+            agenda['this_week'].append(task)
+    return agenda
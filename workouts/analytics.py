@@ -0,0 +1,86 @@
+"""
+Per-branch training analytics.
+
+Every breakdown is one grouped aggregate over the branch's tasks, so a
+report costs four queries whatever the number of tasks. Reports are cached
+per branch under a versioned namespace (see CORE.cache) that is bumped
+whenever a task or plan of the branch changes.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from CORE.cache import bump_on_commit, versioned_key
+from .models import WorkoutTask
+
+ANALYTICS_NAMESPACE = 'branch-analytics:{}'
+
+
+def invalidate_branch_analytics(*branch_ids):
+    bump_on_commit(*(ANALYTICS_NAMESPACE.format(branch_id) for branch_id in set(branch_ids) if branch_id))
+
+
+def get_branch_analytics(branch_id, weeks=12):
+    today = timezone.localdate()
+    key = versioned_key(ANALYTICS_NAMESPACE.format(branch_id), today.isoformat(), weeks)
+    report = cache.get(key)
+    if report is None:
+        report = compute_branch_analytics(branch_id, today, weeks)
+        cache.set(key, report, settings.ANALYTICS_CACHE_TTL)
+    return report
+
+
+def metrics(today):
+    completed = Q(status='COMPLETED')
+    # Days between the due date and the day the task was completed (negative = early)
+    delay = ExpressionWrapper(TruncDate('completed_at') - F('due_date'), output_field=DurationField())
+    return {
+        'total': Count('id'),
+        'completed': Count('id', filter=completed),
+        'overdue': Count('id', filter=Q(due_date__lt=today) & ~completed),
+        'avg_completion_delay': Avg(delay, filter=completed),
+    }
+
+
+def format_row(row):
+    delay = row.pop('avg_completion_delay')
+    row['completion_rate'] = round(row['completed'] / row['total'], 4) if row['total'] else None
+    row['avg_days_to_complete'] = round(delay.total_seconds() / 86400, 2) if delay is not None else None
+    return row
+
+
+def compute_branch_analytics(branch_id, today, weeks=12):
+    tasks = WorkoutTask.objects.filter(workout_plan__gym_branch_id=branch_id).order_by()
+    aggregates = metrics(today)
+
+    summary = format_row(tasks.aggregate(**aggregates))
+
+    by_trainer = tasks.values(
+        trainer_id=F('workout_plan__created_by_id'),
+        trainer_email=F('workout_plan__created_by__email'),
+        trainer_first_name=F('workout_plan__created_by__first_name'),
+        trainer_last_name=F('workout_plan__created_by__last_name'),
+    ).annotate(**aggregates).order_by('trainer_id')
+
+    by_plan = tasks.values(
+        plan_id=F('workout_plan_id'),
+        plan_title=F('workout_plan__title'),
+    ).annotate(**aggregates).order_by('plan_id')
+
+    first_week = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    by_week = tasks.filter(due_date__gte=first_week, due_date__lte=today).values(
+        week=TruncWeek('due_date'),
+    ).annotate(**aggregates).order_by('week')
+
+    return {
+        'branch': branch_id,
+        'as_of': today,
+        'summary': summary,
+        'by_trainer': [format_row(row) for row in by_trainer],
+        'by_plan': [format_row(row) for row in by_plan],
+        'by_week': [format_row(row) for row in by_week],
+    }
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from gyms.models import GymBranch
+from workouts.models import WorkoutTask
+from workouts.signals import overdue_tasks_flagged
+
+
+class Command(BaseCommand):
+    help = (
+        'Flags overdue, not yet flagged workout tasks branch by branch, in short '
+        'chunked transactions, and sends overdue_tasks_flagged for each chunk (which '
+        'emails the members a reminder).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Tasks flagged per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many tasks would be flagged without changing anything.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        today = timezone.localdate()
+        total = 0
+
+        for branch_id in GymBranch.objects.order_by('id').values_list('id', flat=True):
+            pending = WorkoutTask.objects.overdue(today).filter(
+                workout_plan__gym_branch_id=branch_id, overdue_flagged_at__isnull=True
+            ).order_by()
+
+            if options['dry_run']:
+                count = pending.count()
+                if count:
+                    self.stdout.write(f'Would flag {count} task(s) in branch {branch_id}.')
+                total += count
+                continue
+
+            flagged = 0
+            while True:
+                # One short transaction per chunk; rows held by a concurrent sweep are skipped
+                with transaction.atomic():
+                    ids = list(
+                        pending.select_for_update(skip_locked=True, of=('self',))
+                        .values_list('id', flat=True)[:options['chunk_size']]
+                    )
+                    if not ids:
+                        break
+                    WorkoutTask.objects.filter(id__in=ids).update(overdue_flagged_at=timezone.now())
+                overdue_tasks_flagged.send(sender=WorkoutTask, branch_id=branch_id, task_ids=ids)
+                flagged += len(ids)
+
+            if flagged:
+                self.stdout.write(f'Flagged {flagged} task(s) in branch {branch_id}.')
+            total += flagged
+
+        verb = 'Would flag' if options['dry_run'] else 'Flagged'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total} overdue task(s) in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workouttask',
+            index=models.Index(fields=['-created_at', '-id'], name='workout_tas_created_d0061e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workouttask',
+            index=models.Index(fields=['member', '-created_at'], name='workout_tas_member__5ea19a_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0002_workouttask_workout_tas_created_d0061e_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workouttask',
+            name='overdue_flagged_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='workouttask',
+            index=models.Index(condition=models.Q(('status', 'COMPLETED'), _negated=True), fields=['due_date'], name='workout_task_open_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0003_workouttask_overdue_flagged_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workouttask',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
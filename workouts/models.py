@@ -1,10 +1,13 @@
 from django.db import models
+from django.db.models.signals import post_save
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.conf import settings  # Best practice to refer to User model
 
+from CORE.validation import ValidateOnSaveMixin
 
-class WorkoutPlan(models.Model):
+
+class WorkoutPlan(ValidateOnSaveMixin, models.Model):
     """Workout Plan created by trainers"""
 
     title = models.CharField(max_length=255)
@@ -51,7 +54,7 @@ class WorkoutPlan(models.Model):
             })
 
         # Ensure gym branch matches creator's branch
-        if self.created_by and self.created_by.gym_branch != self.gym_branch:
+        if self.created_by and self.created_by.gym_branch_id != self.gym_branch_id:
             raise ValidationError({
                 'gym_branch': 'Workout plan must belong to trainer\'s gym branch'
             })
@@ -60,11 +63,27 @@ class WorkoutPlan(models.Model):
         # Auto-set gym_branch from trainer if not provided
         if not self.gym_branch and self.created_by:
             self.gym_branch = self.created_by.gym_branch
-        self.full_clean()
+        self.validate_on_save()
         super().save(*args, **kwargs)
 
 
-class WorkoutTask(models.Model):
+class WorkoutTaskQuerySet(models.QuerySet):
+
+    def overdue(self, today=None):
+        """
+        Tasks past their due date and not completed. Written as
+        NOT completed AND due_date < today so it matches the partial
+        open-tasks index on due_date.
+        """
+        today = today or timezone.localdate()
+        return self.exclude(status='COMPLETED').filter(due_date__lt=today)
+
+    def not_overdue(self, today=None):
+        today = today or timezone.localdate()
+        return self.filter(models.Q(status='COMPLETED') | models.Q(due_date__gte=today))
+
+
+class WorkoutTask(ValidateOnSaveMixin, models.Model):
     """Workout tasks assigned to members"""
 
     STATUS_CHOICES = [
@@ -72,6 +91,14 @@ class WorkoutTask(models.Model):
         ('IN_PROGRESS', 'In Progress'),
         ('COMPLETED', 'Completed'),
     ]
+    # Allowed status changes. PENDING -> IN_PROGRESS -> COMPLETED is the
+    # normal path; a pending task may be completed in one step, and each
+    # step can be undone once (COMPLETED -> IN_PROGRESS -> PENDING).
+    TRANSITIONS = {
+        'PENDING': {'IN_PROGRESS', 'COMPLETED'},
+        'IN_PROGRESS': {'PENDING', 'COMPLETED'},
+        'COMPLETED': {'IN_PROGRESS'},
+    }
 
     workout_plan = models.ForeignKey(
         WorkoutPlan,
@@ -94,9 +121,16 @@ class WorkoutTask(models.Model):
     due_date = models.DateField()
     notes = models.TextField(blank=True, null=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Set by the flag_overdue_tasks sweep when the task is reported overdue;
+    # cleared when the due date moves, so the sweep may report it again
+    overdue_flagged_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bumped on every write; clients send it back in If-Match (see update_if_current)
+    version = models.PositiveIntegerField(default=1, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WorkoutTaskQuerySet.as_manager()
+
     class Meta:
         db_table = 'workout_tasks'
         ordering = ['-created_at']
@@ -106,11 +140,38 @@ class WorkoutTask(models.Model):
             models.Index(fields=['workout_plan']),
             models.Index(fields=['due_date']),
             models.Index(fields=['status']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['member', '-created_at']),
+            # Open tasks only: serves the overdue filter and sweep
+            models.Index(
+                fields=['due_date'],
+                condition=~models.Q(status='COMPLETED'),
+                name='workout_task_open_due_idx',
+            ),
         ]
 
     def __str__(self):
         return f"{self.workout_plan.title} - {self.member.email} ({self.status})"
 
+    # Member as loaded, so a reassignment can invalidate the previous member's agenda
+    loaded_member_id = None
+    # Status as loaded, to check the transition on save
+    loaded_status = None
+    # Due date as loaded, so moving it clears the overdue flag
+    loaded_due_date = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_member_id = instance.__dict__.get('member_id')
+        instance.loaded_status = instance.__dict__.get('status')
+        instance.loaded_due_date = instance.__dict__.get('due_date')
+        return instance
+
+    @classmethod
+    def can_transition(cls, current, target):
+        return current == target or target in cls.TRANSITIONS.get(current, ())
+
     def clean(self):
         """Validate business rules"""
         super().clean()
@@ -123,27 +184,76 @@ class WorkoutTask(models.Model):
 
         # Ensure member belongs to same branch as workout plan
         if self.member and self.workout_plan:
-            if self.member.gym_branch != self.workout_plan.gym_branch:
+            if self.member.gym_branch_id != self.workout_plan.gym_branch_id:
                 raise ValidationError({
                     'member': 'Cannot assign tasks to members from different gym branches'
                 })
 
+        if self.loaded_status and not self.can_transition(self.loaded_status, self.status):
+            raise ValidationError({
+                'status': f'Cannot change status from {self.loaded_status} to {self.status}'
+            })
+
     def save(self, *args, **kwargs):
-        self.full_clean()
+        self.validate_on_save()
 
         # Auto-set completed_at when status changes to COMPLETED
-        if self.status == 'COMPLETED' and not self.completed_at:
-            self.completed_at = timezone.now()
-        elif self.status != 'COMPLETED' and self.completed_at:
-            self.completed_at = None
+        self.completed_at = self.completion_time(self.status, self.completed_at)
+        if not self._state.adding:
+            self.version += 1
+        if self.loaded_due_date is not None and self.due_date != self.loaded_due_date:
+            self.overdue_flagged_at = None
 
         super().save(*args, **kwargs)
+        self.loaded_status = self.status
+        self.loaded_due_date = self.due_date
+
+    @staticmethod
+    def completion_time(status, completed_at):
+        if status != 'COMPLETED':
+            return None
+        return completed_at or timezone.now()
+
+    def update_if_current(self, changes, version=None):
+        """
+        Apply `changes` (field name -> value) with a single conditional UPDATE.
+
+        The row is only written if it still has `version` (by default the
+        version this instance was loaded with), so a concurrent edit is never
+        overwritten. Returns False, leaving the instance as it was, if the
+        row has changed (or is gone). No model validation runs here at all,
+        neither field, uniqueness nor clean() checks; callers validate first
+        (see WorkoutTaskSerializer). post_save is sent as for save(), so
+        caches depending on the task are invalidated the same way.
+        """
+        expected = self.version if version is None else version
+        values = dict(changes)
+        values['completed_at'] = self.completion_time(
+            values.get('status', self.status), values.get('completed_at', self.completed_at)
+        )
+        values['updated_at'] = timezone.now()
+        values['version'] = expected + 1
+        if 'due_date' in values and values['due_date'] != self.due_date:
+            values['overdue_flagged_at'] = None
+
+        if not WorkoutTask.objects.filter(pk=self.pk, version=expected).update(**values):
+            return False
+
+        for name, value in values.items():
+            setattr(self, name, value)
+        self.loaded_status = self.status
+        self.loaded_due_date = self.due_date
+        post_save.send(
+            sender=WorkoutTask, instance=self, created=False, update_fields=frozenset(values),
+            raw=False, using=self._state.db,
+        )
+        return True
 
     @property
     def is_overdue(self):
         if self.status == 'COMPLETED':
             return False
-        return self.due_date < timezone.now().date()
+        return self.due_date < timezone.localdate()
 
     @property
     def gym_branch(self):
@@ -44,7 +44,7 @@ class PlanAccessPermission(permissions.BasePermission):
         if user.role == 'ADMIN':
             return True
         # Trainers/Managers can only view plans in their branch
-        return obj.gym_branch == user.gym_branch
+        return obj.gym_branch_id == user.gym_branch_id
 
 
 class TaskAccessPermission(permissions.BasePermission):
@@ -61,7 +61,7 @@ class TaskAccessPermission(permissions.BasePermission):
 
         # Member can only access their own task
         if user.role == 'MEMBER':
-            return obj.member == user
+            return obj.member_id == user.id
 
         # Staff can access tasks in their branch
-        return obj.workout_plan.gym_branch == user.gym_branch
\ No newline at end of file
+        return obj.workout_plan.gym_branch_id == user.gym_branch_id
\ No newline at end of file
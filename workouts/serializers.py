@@ -1,11 +1,26 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from .models import WorkoutPlan, WorkoutTask
 from django.contrib.auth import get_user_model
 
+from CORE.validation import PrevalidatedSaveMixin
+
 User = get_user_model()
 
 
-class WorkoutPlanSerializer(serializers.ModelSerializer):
+def validate_status_transition(serializer, value):
+    task = serializer.instance
+    if task is not None and not WorkoutTask.can_transition(task.status, value):
+        raise serializers.ValidationError(f"Cannot change status from {task.status} to {value}.")
+    return value
+
+
+class WorkoutPlanSerializer(PrevalidatedSaveMixin, serializers.ModelSerializer):
+    # created_by / gym_branch are read-only here and set by the view from the
+    # requesting trainer, which is exactly what WorkoutPlan.clean() checks
+    prevalidated_invariants = ('fields', 'rules')
+
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     gym_branch_name = serializers.CharField(source='gym_branch.name', read_only=True)
 
@@ -16,32 +31,45 @@ class WorkoutPlanSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_by', 'gym_branch']
 
 
-class WorkoutTaskSerializer(serializers.ModelSerializer):
+class WorkoutTaskSerializer(PrevalidatedSaveMixin, serializers.ModelSerializer):
+    # Fields, unique_together and the WorkoutTask.clean() rules are all checked
+    # below. Only creates save through the serializer; updates are written by
+    # WorkoutTask.update_if_current(), which runs no model validation at all
+    prevalidated_invariants = ('fields', 'unique', 'rules')
+
     workout_plan_title = serializers.CharField(source='workout_plan.title', read_only=True)
     member_name = serializers.CharField(source='member.get_full_name', read_only=True)
 
     class Meta:
         model = WorkoutTask
         fields = ['id', 'workout_plan', 'workout_plan_title', 'member', 'member_name', 'status', 'due_date', 'notes',
-                  'completed_at']
+                  'completed_at', 'version']
+
+    def validate_status(self, value):
+        return validate_status_transition(self, value)
 
     def validate(self, attrs):
         request = self.context.get('request')
         user = request.user
+        plan = attrs.get('workout_plan') or self.instance.workout_plan
+        member = attrs.get('member') or self.instance.member
 
         # Validation for Create/Update by Trainer
         if user.role == 'TRAINER':
-            plan = attrs.get('workout_plan') or self.instance.workout_plan
-            member = attrs.get('member') or self.instance.member
-
             # Rule: Trainer cannot assign to member of another branch
-            if member.gym_branch != user.gym_branch:
+            if member.gym_branch_id != user.gym_branch_id:
                 raise serializers.ValidationError({"member": "You cannot assign tasks to members of another branch."})
 
             # Rule: Plan must belong to the trainer's branch
-            if plan.gym_branch != user.gym_branch:
+            if plan.gym_branch_id != user.gym_branch_id:
                 raise serializers.ValidationError({"workout_plan": "You can only use workout plans from your branch."})
 
+        # Model rules (WorkoutTask.clean), checked here so save() can skip them
+        if member.role != 'MEMBER':
+            raise serializers.ValidationError({"member": "Tasks can only be assigned to members"})
+        if member.gym_branch_id != plan.gym_branch_id:
+            raise serializers.ValidationError({"member": "Cannot assign tasks to members from different gym branches"})
+
         return attrs
 
 
@@ -53,8 +81,129 @@ class MemberTaskUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = WorkoutTask
-        fields = ['status', 'notes']  # Optional: allow them to add notes
+        fields = ['status', 'notes', 'version']  # Optional: allow them to add notes
 
     def validate_status(self, value):
-        # Prevent member from setting status back to Pending if wanted
-        return value
\ No newline at end of file
+        return validate_status_transition(self, value)
+
+
+class WorkoutTaskBulkAssignSerializer(serializers.Serializer):
+    """
+    Assign one workout plan to many members over a date range.
+    Branch and role rules are checked for the whole member set in one query,
+    and existing (workout_plan, member, due_date) rows are skipped. The
+    created/skipped figures are based on the rows found before the insert.
+    """
+    max_tasks = 20000
+    batch_size = 500
+
+    workout_plan = serializers.PrimaryKeyRelatedField(queryset=WorkoutPlan.objects.all())
+    members = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    whole_branch = serializers.BooleanField(default=False)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField(required=False)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), required=False, allow_empty=False,
+        help_text='Days of the week to schedule (Monday=0). Defaults to every day.'
+    )
+    interval_days = serializers.IntegerField(min_value=1, required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        plan = attrs['workout_plan']
+
+        if plan.gym_branch_id != user.gym_branch_id:
+            raise serializers.ValidationError({"workout_plan": "You can only use workout plans from your branch."})
+
+        if bool(attrs.get('members')) == attrs['whole_branch']:
+            raise serializers.ValidationError("Provide either a list of members or whole_branch, not both.")
+
+        if 'weekdays' in attrs and 'interval_days' in attrs:
+            raise serializers.ValidationError("Use either weekdays or interval_days, not both.")
+
+        attrs.setdefault('end_date', attrs['start_date'])
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError({"end_date": "End date must not be before start date."})
+
+        # Set-wise role/branch check: one query for the whole member list
+        branch_members = User.objects.filter(gym_branch_id=plan.gym_branch_id, role='MEMBER', is_active=True)
+        if attrs['whole_branch']:
+            member_ids = list(branch_members.values_list('id', flat=True))
+        else:
+            requested = set(attrs['members'])
+            member_ids = list(branch_members.filter(pk__in=requested).values_list('id', flat=True))
+            invalid = sorted(requested.difference(member_ids))
+            if invalid:
+                raise serializers.ValidationError({
+                    "members": f"Not active members of this workout plan's branch: {invalid}"
+                })
+
+        due_dates = self.get_due_dates(attrs)
+        if not due_dates:
+            raise serializers.ValidationError("The date range and recurrence select no days.")
+        if len(member_ids) * len(due_dates) > self.max_tasks:
+            raise serializers.ValidationError(f"A bulk assignment cannot create more than {self.max_tasks} tasks.")
+
+        attrs['member_ids'] = member_ids
+        attrs['due_dates'] = due_dates
+        return attrs
+
+    def get_due_dates(self, attrs):
+        start, end = attrs['start_date'], attrs['end_date']
+        weekdays = set(attrs.get('weekdays') or range(7))
+        interval = attrs.get('interval_days', 1)
+
+        due_dates = []
+        day = start
+        while day <= end:
+            if day.weekday() in weekdays:
+                due_dates.append(day)
+            day += timedelta(days=interval)
+        return due_dates
+
+    def create(self, validated_data):
+        plan = validated_data['workout_plan']
+        member_ids = validated_data['member_ids']
+        due_dates = validated_data['due_dates']
+
+        existing = set(
+            WorkoutTask.objects.filter(
+                workout_plan=plan,
+                member_id__in=member_ids,
+                due_date__range=(due_dates[0], due_dates[-1]),
+            ).values_list('member_id', 'due_date')
+        )
+        new_tasks = [
+            WorkoutTask(
+                workout_plan=plan,
+                member_id=member_id,
+                due_date=due_date,
+                notes=validated_data.get('notes'),
+            )
+            for member_id in member_ids
+            for due_date in due_dates
+            if (member_id, due_date) not in existing
+        ]
+        # Rules were validated set-wise above, so skip the per-row full_clean()
+        # in save(); ignore_conflicts covers rows inserted concurrently.
+        WorkoutTask.objects.bulk_create(new_tasks, batch_size=self.batch_size, ignore_conflicts=True)
+
+        # 'created' counts the rows this request attempted to insert: a row
+        # another request inserted in between is dropped as a conflict but
+        # still counted, as bulk_create() cannot report which rows it skipped
+        return {
+            'workout_plan': plan.pk,
+            'members': len(member_ids),
+            'due_dates': len(due_dates),
+            'created': len(new_tasks),
+            'skipped': len(member_ids) * len(due_dates) - len(new_tasks),
+        }
+
+
+class WorkoutTaskBulkStatusSerializer(serializers.Serializer):
+    """Move a list of tasks to one status."""
+    max_tasks = 500
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=max_tasks)
+    status = serializers.ChoiceField(choices=WorkoutTask.STATUS_CHOICES)
@@ -0,0 +1,74 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from account.mailer import queue_mail
+from CORE.cache import track_model_changes
+from .agenda import invalidate_member_agenda, invalidate_plan_agendas
+from .analytics import invalidate_branch_analytics
+from .models import WorkoutPlan, WorkoutTask
+
+# Sent by flag_overdue_tasks after each committed chunk, with `branch_id` and
+# `task_ids` (see notify_overdue_members)
+overdue_tasks_flagged = Signal()
+
+track_model_changes(WorkoutPlan, WorkoutTask)
+
+
+def task_branch_id(task, origin=None):
+    """
+    Branch of a task's plan. Saves have the plan loaded already (validation,
+    the view's select_related); cascade deletes do not, so those resolve it
+    from the deleted plan or once per plan, memoized on the delete's origin.
+    """
+    if WorkoutTask.workout_plan.is_cached(task):
+        return task.workout_plan.gym_branch_id
+    if isinstance(origin, WorkoutPlan) and origin.pk == task.workout_plan_id:
+        return origin.gym_branch_id
+    if origin is None:
+        return task.workout_plan.gym_branch_id
+
+    branches = origin.__dict__.setdefault('_plan_branch_ids', {})
+    if task.workout_plan_id not in branches:
+        branches[task.workout_plan_id] = (
+            WorkoutPlan.objects.filter(pk=task.workout_plan_id).values_list('gym_branch_id', flat=True).first()
+        )
+    return branches[task.workout_plan_id]
+
+
+@receiver([post_save, post_delete], sender=WorkoutTask)
+def task_changed(sender, instance, **kwargs):
+    invalidate_branch_analytics(task_branch_id(instance, kwargs.get('origin')))
+    invalidate_member_agenda(instance.member_id, instance.loaded_member_id)
+
+
+@receiver(post_save, sender=WorkoutPlan)
+def plan_saved(sender, instance, created, **kwargs):
+    invalidate_branch_analytics(instance.gym_branch_id)
+    if not created:
+        invalidate_plan_agendas(instance.pk)
+
+
+@receiver(post_delete, sender=WorkoutPlan)
+def plan_deleted(sender, instance, **kwargs):
+    # The plan's tasks were deleted first, each invalidating its member's agenda
+    invalidate_branch_analytics(instance.gym_branch_id)
+
+
+@receiver(overdue_tasks_flagged)
+def notify_overdue_members(sender, task_ids, **kwargs):
+    """One reminder per member, listing the tasks this chunk flagged."""
+    rows = (
+        WorkoutTask.objects.filter(pk__in=task_ids)
+        .order_by('member__email', 'due_date')
+        .values_list('member__email', 'workout_plan__title', 'due_date')
+    )
+    for email, tasks in groupby(rows, key=itemgetter(0)):
+        lines = [f'- {title}, due {due_date:%Y-%m-%d}' for _, title, due_date in tasks]
+        queue_mail(
+            'You have overdue workouts',
+            'These workouts are past their due date:\n\n' + '\n'.join(lines),
+            [email],
+        )
@@ -0,0 +1,7 @@
+from celery import shared_task
+from django.core.management import call_command
+
+
+@shared_task
+def flag_overdue_tasks():
+    call_command('flag_overdue_tasks')
@@ -1,17 +1,38 @@
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .agenda import get_member_agenda, invalidate_member_agenda
+from .analytics import invalidate_branch_analytics
 from .models import WorkoutPlan, WorkoutTask
 from .serializers import (
     WorkoutPlanSerializer,
     WorkoutTaskSerializer,
-    MemberTaskUpdateSerializer
+    MemberTaskUpdateSerializer,
+    WorkoutTaskBulkAssignSerializer,
+    WorkoutTaskBulkStatusSerializer
 )
 from .permissions import PlanAccessPermission, TaskAccessPermission
-
-
-class WorkoutPlanViewSet(viewsets.ModelViewSet):
+from account.authentication import ClaimsJWTAuthentication
+from account.idempotency import IdempotentCreateMixin
+from account.models import User
+from CORE.cache import CachedResponseMixin, bump_models
+from CORE.conditional import ConditionalGetMixin, EditConflict, PreconditionFailed, if_match_version
+from CORE.exports import StreamingExportMixin
+from CORE.fieldsets import SparseFieldsetMixin
+from CORE.pagination import KeysetOrOffsetPagination
+from CORE.values import ValuesListMixin
+from gyms.models import GymBranch
+
+
+class WorkoutPlanViewSet(IdempotentCreateMixin, CachedResponseMixin, SparseFieldsetMixin, ConditionalGetMixin,
+                         viewsets.ModelViewSet):
     """
     Manage Workout Plans.
     - Create: Trainers only.
@@ -20,17 +41,25 @@ class WorkoutPlanViewSet(viewsets.ModelViewSet):
     """
     serializer_class = WorkoutPlanSerializer
     permission_classes = [IsAuthenticated, PlanAccessPermission]
+    authentication_classes = [ClaimsJWTAuthentication]
+    conditional_related = ('created_by', 'gym_branch')
+    cache_models = (WorkoutPlan, User, GymBranch)
+    field_sources = {'created_by_name': ('created_by__first_name', 'created_by__last_name')}
+    sparse_object_fields = ('gym_branch',)
 
     def get_queryset(self):
         user = self.request.user
 
+        # Serializer reads created_by / gym_branch names, join them up front
+        queryset = WorkoutPlan.objects.select_related('created_by', 'gym_branch')
+
         # Admin sees all
         if user.role == 'ADMIN':
-            return WorkoutPlan.objects.all()
+            return queryset
 
         # Trainers/Managers see branch plans
         if user.role in ['TRAINER', 'MANAGER']:
-            return WorkoutPlan.objects.filter(gym_branch=user.gym_branch)
+            return queryset.filter(gym_branch_id=user.gym_branch_id)
 
         # Members see nothing (Strict Rule)
         return WorkoutPlan.objects.none()
@@ -47,7 +76,8 @@ class WorkoutPlanViewSet(viewsets.ModelViewSet):
         )
 
 
-class WorkoutTaskViewSet(viewsets.ModelViewSet):
+class WorkoutTaskViewSet(IdempotentCreateMixin, SparseFieldsetMixin, ConditionalGetMixin, ValuesListMixin,
+                         StreamingExportMixin, viewsets.ModelViewSet):
     """
     Manage Workout Tasks.
     - Trainers: Create & Assign tasks.
@@ -55,26 +85,62 @@ class WorkoutTaskViewSet(viewsets.ModelViewSet):
     - Managers: View branch tasks.
     """
     permission_classes = [IsAuthenticated, TaskAccessPermission]
+    authentication_classes = [ClaimsJWTAuthentication]
+    pagination_class = KeysetOrOffsetPagination
+    conditional_related = ('workout_plan', 'member')
+    # Detail ETags carry the version, so they can be sent back in If-Match
+    etag_version_field = 'version'
+    values_computed = {
+        'member_name': (('member__first_name', 'member__last_name'), User.format_full_name),
+    }
+    sparse_object_fields = ('member', 'workout_plan__gym_branch')
+    export_filename = 'workout_tasks'
+    export_columns = (
+        ('id', 'id'),
+        ('workout_plan', 'workout_plan_id'),
+        ('workout_plan_title', 'workout_plan__title'),
+        ('member', 'member_id'),
+        ('member_email', 'member__email'),
+        ('member_first_name', 'member__first_name'),
+        ('member_last_name', 'member__last_name'),
+        ('status', 'status'),
+        ('due_date', 'due_date'),
+        ('notes', 'notes'),
+        ('completed_at', 'completed_at'),
+        ('created_at', 'created_at'),
+    )
 
     def get_serializer_class(self):
         # If a member is updating, use restricted serializer
         if self.action in ['update', 'partial_update'] and self.request.user.role == 'MEMBER':
             return MemberTaskUpdateSerializer
+        if self.action == 'bulk_assign':
+            return WorkoutTaskBulkAssignSerializer
+        if self.action == 'bulk_status':
+            return WorkoutTaskBulkStatusSerializer
         return WorkoutTaskSerializer
 
     def get_queryset(self):
         user = self.request.user
 
+        # Serializer reads workout_plan.title / member name, join them up front
+        queryset = WorkoutTask.objects.select_related('workout_plan', 'member')
+
+        # Filter by overdue state if provided (evaluated in SQL)
+        overdue = self.request.query_params.get('overdue', None)
+        if overdue is not None:
+            queryset = queryset.overdue() if overdue.lower() == 'true' else queryset.not_overdue()
+
         if user.role == 'ADMIN':
-            return WorkoutTask.objects.all()
+            return queryset
 
         # Trainers/Managers see all tasks in their branch
         if user.role in ['TRAINER', 'MANAGER']:
-            return WorkoutTask.objects.filter(workout_plan__gym_branch=user.gym_branch)
+            return queryset.filter(workout_plan__gym_branch_id=user.gym_branch_id)
 
         # Members ONLY see their own tasks
         if user.role == 'MEMBER':
-            return WorkoutTask.objects.filter(member=user)
+            return queryset.filter(member_id=user.id)
 
         return WorkoutTask.objects.none()
 
@@ -84,8 +150,90 @@ class WorkoutTaskViewSet(viewsets.ModelViewSet):
         serializer.save()
 
     def perform_update(self, serializer):
-        # Business Logic: Auto-timestamp completion
-        instance = serializer.save()
-        if instance.status == 'COMPLETED' and not instance.completed_at:
-            instance.completed_at = timezone.now()
-            instance.save()
\ No newline at end of file
+        # One conditional UPDATE: completed_at is stamped in the same write,
+        # and a task changed since it was read (If-Match, or by a concurrent
+        # request) is never overwritten
+        version = if_match_version(self.request)
+        if not serializer.instance.update_if_current(serializer.validated_data, version=version):
+            raise PreconditionFailed() if version is not None else EditConflict()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream every task in the caller's scope as CSV or NDJSON."""
+        return self.export_response(self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False, methods=['get'])
+    def agenda(self, request):
+        """Today's tasks, the rest of this week and overdue tasks of the calling member."""
+        if request.user.role != 'MEMBER':
+            raise PermissionDenied("Only members have an agenda.")
+        return Response(get_member_agenda(request.user.id))
+
+    @action(detail=False, methods=['post'], url_path='bulk-assign')
+    def bulk_assign(self, request):
+        """Assign a workout plan to many members over a date range in one request."""
+        if request.user.role != 'TRAINER':
+            raise PermissionDenied("Only trainers can assign tasks.")
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        if result['created']:
+            bump_models(WorkoutTask)
+            invalidate_branch_analytics(serializer.validated_data['workout_plan'].gym_branch_id)
+            invalidate_member_agenda(*serializer.validated_data['member_ids'])
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Set the status of many tasks with a single UPDATE.
+        Ids outside the caller's task scope are reported as not_found.
+        """
+        if request.user.role == 'MANAGER':
+            raise PermissionDenied("Managers have read-only access to tasks.")
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        target = serializer.validated_data['status']
+
+        with transaction.atomic():
+            # Same scoping as list/retrieve. The task rows stay locked until
+            # the UPDATE, so every id judged updatable below is written
+            rows = self.get_queryset().filter(pk__in=ids).select_for_update(of=('self',)).values_list(
+                'id', 'status', 'workout_plan__gym_branch_id', 'member_id'
+            )
+            current, to_update, branches, members = {}, [], set(), set()
+            for pk, task_status, branch_id, member_id in rows:
+                current[pk] = task_status
+                if task_status != target and WorkoutTask.can_transition(task_status, target):
+                    to_update.append(pk)
+                    branches.add(branch_id)
+                    members.add(member_id)
+
+            if to_update:
+                now = timezone.now()
+                # Same completed_at semantics as WorkoutTask.save()
+                completed_at = Coalesce('completed_at', Value(now)) if target == 'COMPLETED' else None
+                WorkoutTask.objects.filter(pk__in=to_update).update(
+                    status=target, completed_at=completed_at, updated_at=now, version=F('version') + 1
+                )
+                bump_models(WorkoutTask)
+                invalidate_branch_analytics(*branches)
+                invalidate_member_agenda(*members)
+
+        updated = set(to_update)
+        results = []
+        for pk in ids:
+            if pk not in current:
+                result = 'not_found'
+            elif pk in updated:
+                result = 'updated'
+            elif current[pk] == target:
+                result = 'unchanged'
+            else:
+                result = 'invalid_transition'
+            results.append({'id': pk, 'result': result})
+
+        return Response({'status': target, 'updated': len(updated), 'results': results})